@@ -40,6 +40,9 @@ setuptools.setup(
     download_url='https://github.com/jochemb/toggl-timewax/tarball/{}/'.format(version_string),
 
     install_requires=required_packages,
+    extras_require={
+        'fast': ['ijson>=3.1', 'numpy'],
+    },
 
     entry_points={
         'console_scripts': [
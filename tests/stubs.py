@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory stand-ins for the Toggl and Timewax APIs. StubServices replaces the
+requests.Session of a Transport, so everything above the session, including
+request counting and budgets, runs as it does against the real services.
+"""
+from __future__ import absolute_import, division, print_function
+
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import io
+import itertools
+import json
+
+import arrow
+import requests
+
+from toggl_timewax.backfill import ReportsBackfill
+from toggl_timewax.main import Timewax, Toggl
+from toggl_timewax.transport import Transport
+
+# Python 2/3 compatibility
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+USER = u'JDOE'
+WID = 1
+
+
+def make_response(body, status_code=200):
+    """ requests.Response with body, which is encoded as JSON unless it is text. """
+    if not isinstance(body, (type(u''), bytes)):
+        body = json.dumps(body)
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+
+    response = requests.Response()
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class StubServices(object):
+    """
+    Toggl and Timewax for one user. Fill the attributes, or use add_catalog,
+    then pass transport() to Toggl and Timewax.
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1000)
+
+        # Toggl
+        self.workspaces = [{'id': WID, 'name': u'Work'}]
+        self.clients = {}
+        self.projects = {}
+        self.time_entries = []
+        self.time_entries_limit = 1000
+        self.report_per_page = 50
+        # Catalog changes are stamped with a counter that /me returns as 'since'.
+        self.since = 1
+        self.changed = {}
+        self.deleted = []
+
+        # Timewax: project code -> (name, [(breakdown code, breakdown name)])
+        self.timewax_projects = {}
+        self.timewax_entries = []
+        self.unauthorised = set()
+
+        self.requests = []
+
+    def next_id(self):
+        return next(self._ids)
+
+    def add_catalog(self, n_clients, n_projects, in_toggl=True):
+        """
+        Timewax projects with breakdowns and, if in_toggl, the same as clients
+        and projects in Toggl.
+
+        :param int n_clients: number of Timewax projects / Toggl clients.
+        :param int n_projects: number of breakdowns / Toggl projects per client.
+        """
+        for c in range(n_clients):
+            code = u'%08d' % (10000000 + c)
+            breakdowns = [(u'%03d' % p, u'Breakdown %s' % p) for p in range(n_projects)]
+            self.timewax_projects[code] = (u'Project %s' % c, breakdowns)
+
+            if in_toggl:
+                cid = self.add_client(u'%s - Project %s' % (code, c))
+                for breakdown_code, breakdown_name in breakdowns:
+                    self.add_project(u'%s - %s' % (breakdown_code, breakdown_name), cid)
+
+    def add_client(self, name, wid=WID):
+        cid = self.next_id()
+        self.clients[cid] = {'id': cid, 'wid': wid, 'name': name}
+        self.touch('clients', cid)
+        return cid
+
+    def add_project(self, name, cid, wid=WID):
+        pid = self.next_id()
+        self.projects[pid] = {'id': pid, 'wid': wid, 'cid': cid, 'name': name}
+        self.touch('projects', pid)
+        return pid
+
+    def rename(self, kind, id_, name):
+        """ Rename a client or project, kind is 'clients' or 'projects'. """
+        getattr(self, kind)[id_]['name'] = name
+        self.touch(kind, id_)
+
+    def delete(self, kind, id_):
+        """ Delete a client or project, kind is 'clients' or 'projects'. """
+        obj = getattr(self, kind).pop(id_)
+        self.since += 1
+        self.deleted.append((kind, dict(obj, server_deleted_at=u'2020-01-01T00:00:00+00:00'), self.since))
+
+    def touch(self, kind, id_):
+        self.since += 1
+        self.changed[kind, id_] = self.since
+
+    def add_time_entry(self, pid, start, duration=3600, wid=WID):
+        start = arrow.get(start)
+        entry = {'id': self.next_id(), 'guid': u'guid-%s' % self.next_id(), 'wid': wid, 'pid': pid,
+                 'description': u'work', 'duration': duration, 'start': start.isoformat(),
+                 'stop': start.shift(seconds=duration).isoformat()}
+        self.time_entries.append(entry)
+        return entry
+
+    def transport(self, **kwargs):
+        """ Transport that sends its requests here. """
+        transport = Transport(**kwargs)
+        transport.session = self
+        return transport
+
+    def toggl(self, transport, **kwargs):
+        return Toggl(u'key', u'Work', transport=transport, **kwargs)
+
+    def timewax(self, transport):
+        return Timewax(USER, u'password', u'ACME', transport=transport)
+
+    # The part of requests.Session that Transport uses.
+
+    def request(self, method, url, params=None, json=None, data=None, **kwargs):
+        params = params or {}
+        self.requests.append((method, url, params))
+        parsed = urlparse(url)
+        path = parsed.path.rstrip('/')
+
+        if parsed.netloc == 'api.timewax.com':
+            return make_response(self.timewax_api(path, ElementTree.fromstring(data)))
+        if path == urlparse(ReportsBackfill.DETAILS).path:
+            return make_response(self.report(params))
+        return self.toggl_v8(method, path.split('/api/v8/')[1].split('/'), params, json)
+
+    def toggl_v8(self, method, parts, params, body):
+        if method == 'POST':
+            data = body['client'] if parts == ['clients'] else body['project']
+            if parts == ['clients']:
+                obj = self.clients[self.add_client(data['name'], data['wid'])]
+            else:
+                obj = self.projects[self.add_project(data['name'], data['cid'], data['wid'])]
+            return make_response({'data': obj})
+
+        if parts == ['workspaces']:
+            return make_response(self.workspaces)
+        if parts[0] == 'workspaces':
+            wid, kind = int(parts[1]), parts[2]
+            objects = self.clients if kind == 'clients' else self.projects
+            return make_response([o for o in objects.values() if o['wid'] == wid])
+        if parts == ['me']:
+            return make_response({'since': self.since, 'data': self.me(params)})
+        if parts[0] in ('projects', 'clients') and len(parts) == 2:
+            objects = self.projects if parts[0] == 'projects' else self.clients
+            obj = objects.get(int(parts[1]))
+            return make_response({'data': obj} if obj else u'Not found', 200 if obj else 404)
+        if parts == ['time_entries']:
+            start = arrow.get(params['start_date'])
+            end = arrow.get(params['end_date']) if 'end_date' in params else arrow.get('2100-01-01')
+            entries = [e for e in self.time_entries if start <= arrow.get(e['start']) <= end]
+            return make_response(entries[:self.time_entries_limit])
+        raise AssertionError(u'Unexpected Toggl request: %s' % u'/'.join(parts))
+
+    def me(self, params):
+        """ The user, with the clients and projects changed since params['since'] if asked for. """
+        data = {'id': 7}
+        if params.get('with_related_data') != 'true':
+            return data
+
+        since = int(params.get('since') or 0)
+        for kind in ('clients', 'projects'):
+            data[kind] = [o for o in getattr(self, kind).values() if self.changed[kind, o['id']] > since]
+            if since:
+                data[kind] += [o for k, o, at in self.deleted if k == kind and at > since]
+        return data
+
+    def report(self, params):
+        pids = {int(pid) for pid in params['project_ids'].split(',')}
+        since, until = params['since'], params['until']
+        rows = [{'id': e['id'], 'pid': e['pid'], 'description': e['description'],
+                 'start': e['start'], 'end': e['stop'], 'dur': e['duration'] * 1000}
+                for e in sorted(self.time_entries, key=lambda e: e['start'])
+                if e['pid'] in pids and since <= e['start'][:10] <= until]
+
+        page = int(params['page'])
+        per_page = self.report_per_page
+        return {'total_count': len(rows), 'per_page': per_page,
+                'data': rows[(page - 1) * per_page:page * per_page]}
+
+    def timewax_api(self, path, request):
+        if path.endswith('/token/get'):
+            return u'<response><token>token</token></response>'
+
+        if path.endswith('/project/list'):
+            return u'<response><projects>%s</projects></response>' % u''.join(
+                u'<project><name>%s</name><code>%s</code></project>' % (escape(name), code)
+                for code, (name, _) in sorted(self.timewax_projects.items()))
+
+        if path.endswith('/breakdown/list'):
+            _, breakdowns = self.timewax_projects[request.findtext('project')]
+            return u'<response><breakdowns>%s</breakdowns></response>' % u''.join(
+                u'<breakdown><name>%s</name><code>%s</code><resource>%s</resource></breakdown>' %
+                (escape(name), code, USER) for code, name in breakdowns)
+
+        if path.endswith('/entries/add'):
+            valid = True
+            for timeline in request.find('timelines'):
+                key = (timeline.findtext('project'), timeline.findtext('breakdown'))
+                if key in self.unauthorised:
+                    valid = False
+                elif float(timeline.findtext('hours')) > 0:
+                    self.timewax_entries.append(timeline)
+            return u'<response><valid>%s</valid></response>' % (u'yes' if valid else u'no')
+
+        if path.endswith('/entries/list'):
+            return u'<response><entries>%s</entries></response>' % u''.join(
+                u'<entry><description>%s</description><project>%s</project><breakdown>%s</breakdown>'
+                u'<hours>%s</hours><date>%s</date></entry>' %
+                (escape(t.findtext('description')), t.findtext('project'), t.findtext('breakdown'),
+                 t.findtext('hours'), t.findtext('date'))
+                for t in self.timewax_entries)
+
+        raise AssertionError(u'Unexpected Timewax request: %s' % path)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import arrow
+
+from toggl_timewax.backfill import ReportsBackfill
+
+from tests.stubs import StubServices
+
+
+def make_backfill(services, since='2020-01-01', until='2020-01-31', **kwargs):
+    transport = services.transport()
+    toggl = services.toggl(transport)
+    return ReportsBackfill(toggl, since, until, **kwargs), transport
+
+
+def entries_per_hour(services, pids, start, n):
+    start = arrow.get(start)
+    return [services.add_time_entry(pids[i % len(pids)], start.shift(hours=i), 1800) for i in range(n)]
+
+
+def test_pagination():
+    services = StubServices()
+    services.add_catalog(1, 1)
+    pid = next(iter(services.projects))
+    created = entries_per_hour(services, [pid], '2020-01-02T08:00:00+00:00', 120)
+
+    backfill, transport = make_backfill(services)
+    entries = list(backfill.iter_entries())
+
+    assert sorted(e.guid for e in entries) == sorted(e['guid'] for e in created)
+    # 120 rows at 50 per page.
+    assert transport.endpoint_counts['toggl.reports'] == 3
+    assert backfill.unmatched == []
+
+
+def test_chunks_by_project_and_period():
+    services = StubServices()
+    services.add_catalog(3, 2)
+    entries_per_hour(services, sorted(services.projects), '2020-01-02T08:00:00+00:00', 12)
+
+    backfill, transport = make_backfill(services, since='2019-06-01', until='2020-05-31')
+    backfill.MAX_PROJECTS = 4
+
+    assert [len(pids) for _, pids in backfill.project_chunks()] == [4, 2]
+    assert len(list(backfill.windows())) == 2
+
+    entries = list(backfill.iter_entries())
+    assert len(entries) == 12
+    # One page for each project chunk and window.
+    assert transport.endpoint_counts['toggl.reports'] == 4
+
+
+def test_only_timewax_projects():
+    services = StubServices()
+    services.add_catalog(1, 1)
+    pid = next(iter(services.projects))
+    other = services.add_project(u'Not from Timewax', services.add_client(u'Other client'))
+    lunch = services.add_project(u'Lunch', services.projects[pid]['cid'])
+    entries_per_hour(services, [pid, other, lunch], '2020-01-02T08:00:00+00:00', 9)
+
+    backfill, transport = make_backfill(services)
+    assert {e.pid for e in backfill.iter_entries()} == {pid}
+    assert backfill.unmatched == []
+    assert transport.endpoint_counts['toggl.reports'] == 1
+
+
+def test_matching_on_id():
+    services = StubServices()
+    services.add_catalog(1, 2)
+    pids = sorted(services.projects)
+    created = entries_per_hour(services, pids, '2020-01-02T08:00:00+00:00', 6)
+
+    backfill, _ = make_backfill(services)
+    entries = {e.guid: e for e in backfill.iter_entries()}
+
+    for entry in created:
+        time_entry = entries[entry['guid']]
+        assert time_entry.pid == entry['pid']
+        assert time_entry.start == entry['start']
+        assert time_entry.duration == entry['duration']
+        assert (time_entry.project, time_entry.breakdown) == backfill.toggl.get_timewax_project_breakdown(
+            entry['pid'])
+
+
+def test_time_entries_span_is_split_below_limit():
+    services = StubServices()
+    services.add_catalog(1, 1)
+    pid = next(iter(services.projects))
+    created = entries_per_hour(services, [pid], '2020-01-02T08:00:00+00:00', 40)
+    services.time_entries_limit = 8
+    services.report_per_page = 40
+
+    backfill, transport = make_backfill(services)
+    backfill.TIME_ENTRIES_LIMIT = 8
+    entries = list(backfill.iter_entries())
+
+    assert sorted(e.guid for e in entries) == sorted(e['guid'] for e in created)
+    assert transport.endpoint_counts['toggl.time_entries'] > 5
+    assert backfill.unmatched == []
+
+
+def test_unmatched_rows_are_kept():
+    services = StubServices()
+    services.add_catalog(1, 1)
+    pid = next(iter(services.projects))
+    entries_per_hour(services, [pid], '2020-01-02T08:00:00+00:00', 10)
+    # The endpoint is capped lower than the backfill expects, so entries go missing.
+    services.time_entries_limit = 4
+
+    backfill, _ = make_backfill(services)
+    entries = list(backfill.iter_entries())
+
+    assert len(entries) == 4
+    assert len(backfill.unmatched) == 6
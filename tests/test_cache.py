@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import os
+import time
+
+import pytest
+
+from toggl_timewax.cache import ResponseCache
+from toggl_timewax.main import Timewax
+
+from tests.stubs import StubServices, USER
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'cache'))
+
+
+def test_get_and_set(cache):
+    assert cache.get(u'timewax/ACME/projects') is None
+    cache.set(u'timewax/ACME/projects', u'<response/>')
+
+    assert cache.get(u'timewax/ACME/projects') == u'<response/>'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_ttl(cache, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    cache.set(u'key', u'value')
+
+    monkeypatch.setattr(time, 'time', lambda: now + ResponseCache.DEFAULT_TTL - 1)
+    assert cache.get(u'key') == u'value'
+
+    monkeypatch.setattr(time, 'time', lambda: now + ResponseCache.DEFAULT_TTL + 1)
+    assert cache.get(u'key') is None
+    # Expired entries are removed.
+    assert cache.info()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache'), max_entries=2)
+    cache.set(u'old', 1)
+    cache.set(u'used', 2)
+
+    # Modification times are the record of use.
+    past = time.time() - 100
+    os.utime(cache._path(u'old'), (past, past))
+    os.utime(cache._path(u'used'), (past - 10, past - 10))
+    assert cache.get(u'used') == 2
+
+    cache.set(u'new', 3)
+
+    assert cache.get(u'old') is None
+    assert cache.get(u'used') == 2
+    assert cache.get(u'new') == 3
+
+
+def test_invalidate_by_prefix(cache):
+    cache.set(u'timewax/ACME/projects', 1)
+    cache.set(u'timewax/ACME/breakdowns/10000000', 2)
+    cache.set(u'timewax/OTHER/projects', 3)
+
+    assert cache.invalidate(u'timewax/ACME/') == 2
+    assert cache.get(u'timewax/OTHER/projects') == 3
+    assert cache.invalidate() == 1
+    assert cache.info()['entries'] == 0
+
+
+def test_stats_are_persisted(tmp_path):
+    directory = str(tmp_path / 'cache')
+    first = ResponseCache(directory)
+    first.set(u'key', u'value')
+    first.get(u'key')
+    first.get(u'missing')
+    first.close()
+
+    second = ResponseCache(directory)
+    second.get(u'key')
+    assert second.info()['hits'] == 2
+    second.close()
+
+    stats = ResponseCache(directory).read_stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_only_valid_listings_are_cached(cache):
+    services = StubServices()
+    services.add_catalog(1, 2, in_toggl=False)
+    timewax_api = services.timewax_api
+    failing = [True]
+
+    def flaky(path, request):
+        if failing[0] and path.endswith('/project/list'):
+            return u'<response><valid>no</valid></response>'
+        return timewax_api(path, request)
+
+    services.timewax_api = flaky
+    transport = services.transport()
+    timewax = Timewax(USER, u'password', u'ACME', cache=cache, transport=transport)
+
+    key = timewax.make_cache_key('projects', USER)
+    request = timewax.create_request(u'')
+    _, root = timewax.post_cached(Timewax.PROJECT_LIST, 'timewax.projects', request, key, 'projects')
+    assert root.find('projects') is None
+    assert cache.get(key) is None
+
+    failing[0] = False
+    assert len(list(timewax.list_my_projects())) == 2
+    assert len(list(timewax.list_my_projects())) == 2
+    # The project list and the breakdowns of its project, once.
+    assert transport.endpoint_counts['timewax.projects'] == 2
+    assert transport.endpoint_counts['timewax.breakdowns'] == 1
+    assert cache.info()['entries'] == 2
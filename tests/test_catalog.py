@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+import pytest
+
+from toggl_timewax.catalog import CatalogMirror
+
+from tests.stubs import StubServices
+
+
+@pytest.fixture
+def services():
+    services = StubServices()
+    services.add_catalog(2, 2)
+    return services
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    mirror = CatalogMirror(str(tmp_path / 'catalog.sqlite'))
+    yield mirror
+    mirror.close()
+
+
+def me_params(services):
+    return [params for _, url, params in services.requests if url.endswith('/me')]
+
+
+def make_toggl(services, mirror):
+    return services.toggl(services.transport(), catalog=mirror)
+
+
+def test_first_refresh_downloads_everything(services, mirror):
+    toggl = make_toggl(services, mirror)
+
+    assert 'since' not in me_params(services)[-1]
+    assert len(toggl.clients) == 2
+    assert sum(len(projects) for projects in toggl.projects.values()) == 4
+    assert mirror.since([1]) == services.since
+
+
+def test_second_refresh_sends_since(services, mirror):
+    make_toggl(services, mirror)
+    since = services.since
+    services.requests = []
+
+    toggl = make_toggl(services, mirror)
+
+    assert me_params(services) == [{'with_related_data': 'true', 'since': since}]
+    assert len(toggl.clients) == 2
+    assert sum(len(projects) for projects in toggl.projects.values()) == 4
+
+
+def test_unchanged_catalog_is_not_downloaded_again(services, mirror, caplog):
+    make_toggl(services, mirror)
+    caplog.clear()
+    caplog.set_level(logging.INFO, logger='toggl-timewax')
+
+    make_toggl(services, mirror)
+
+    assert u'updated: 0 clients and 0 projects changed' in caplog.text
+
+
+def test_renames_are_applied(services, mirror):
+    make_toggl(services, mirror)
+    cid = sorted(services.clients)[0]
+    pid = sorted(services.projects)[0]
+    services.rename('clients', cid, u'10000009 - Renamed')
+    services.rename('projects', pid, u'009 - Moved')
+
+    toggl = make_toggl(services, mirror)
+
+    assert toggl.clients[cid].timewax_code == u'10000009'
+    assert toggl.get_timewax_project_breakdown(pid)[1] == u'009'
+
+
+def test_deletions_are_applied(services, mirror):
+    make_toggl(services, mirror)
+    pid = sorted(services.projects)[0]
+    cid = services.projects[pid]['cid']
+    other_cid = [c for c in services.clients if c != cid][0]
+    services.delete('projects', pid)
+    services.delete('clients', other_cid)
+
+    toggl = make_toggl(services, mirror)
+
+    assert pid not in toggl.projects[cid]
+    assert other_cid not in toggl.clients
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+from toggl_timewax import jsonstream
+from toggl_timewax.jsonstream import iter_json_array, iter_json_chunks
+
+PAYLOAD = u"""[
+    {"id": 1, "duration": 3600.5, "description": "quote \\" and backslash \\\\ and \\u00e9"},
+    1.5, -0.25, 12, 1e3, 2.5E-2, -7e+1,
+    "Café ☃", "escaped \\n newline",
+    true, false, null, [], {}, [1, [2.0, {"a": null}]]
+]""".encode('utf-8')
+
+
+def split(data, *offsets):
+    bounds = [0] + list(offsets) + [len(data)]
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def test_whole_payload():
+    assert list(iter_json_chunks([PAYLOAD])) == json.loads(PAYLOAD.decode('utf-8'))
+
+
+def test_split_at_every_offset():
+    expected = json.loads(PAYLOAD.decode('utf-8'))
+    for offset in range(len(PAYLOAD) + 1):
+        assert list(iter_json_chunks(split(PAYLOAD, offset))) == expected, offset
+
+
+def test_single_bytes():
+    expected = json.loads(PAYLOAD.decode('utf-8'))
+    chunks = [PAYLOAD[i:i + 1] for i in range(len(PAYLOAD))]
+    assert list(iter_json_chunks(chunks)) == expected
+
+
+@pytest.mark.parametrize('payload', [b'[{"a":1}, 1.5, 2]', b'[1e10, -2E-3]', b'[123456, 7]'])
+def test_numbers_split_at_every_pair_of_offsets(payload):
+    expected = json.loads(payload.decode('utf-8'))
+    for first in range(len(payload) + 1):
+        for second in range(first, len(payload) + 1):
+            assert list(iter_json_chunks(split(payload, first, second))) == expected, (first, second)
+
+
+def test_float_split_after_point():
+    assert list(iter_json_chunks([b'[{"a":1}, 1.', b'5, 2]'])) == [{'a': 1}, 1.5, 2]
+
+
+@pytest.mark.parametrize('payload', [b'null', b' null ', b'[]', b' [ ] '])
+def test_empty(payload):
+    for offset in range(len(payload) + 1):
+        assert list(iter_json_chunks(split(payload, offset))) == []
+
+
+@pytest.mark.parametrize('payload', [b'{"a": 1}', b'[1, 2', b'[1, ', b'nul', b'',
+                                     b'[1,,2]', b'[,1]', b'[1 2]', b'[1,]', b'[1 , , 2]', b'[{} {}]'])
+def test_invalid(payload):
+    for offset in range(len(payload) + 1):
+        with pytest.raises(ValueError):
+            list(iter_json_chunks(split(payload, offset)))
+
+
+def test_whitespace_around_separators():
+    payload = b'[ 1 ,2\n, "a" ,\t{} ]'
+    for offset in range(len(payload) + 1):
+        assert list(iter_json_chunks(split(payload, offset))) == [1, 2, u'a', {}]
+
+
+class FakeResponse(object):
+
+    encoding = 'utf-8'
+
+    def __init__(self, data):
+        self.data = data
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+
+def test_iter_json_array_without_ijson(monkeypatch):
+    monkeypatch.setattr(jsonstream, 'ijson', None)
+    expected = json.loads(PAYLOAD.decode('utf-8'))
+    for chunk_size in (1, 2, 3, 7, 64, 4096):
+        assert list(iter_json_array(FakeResponse(PAYLOAD), chunk_size)) == expected
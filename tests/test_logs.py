@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import logging
+
+import pytest
+
+from toggl_timewax.logs import LOGGER_NAME, LogSession
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+class Expensive(object):
+    """ Counts how often it is formatted. """
+
+    formatted = 0
+
+    def __repr__(self):
+        Expensive.formatted += 1
+        return u'Expensive()'
+
+
+@pytest.fixture(autouse=True)
+def reset_expensive():
+    Expensive.formatted = 0
+
+
+def log_entries(n):
+    for _ in range(n):
+        logger.debug(u'To be added: %r', Expensive(), extra={'category': 'to be added'})
+    logger.info(u'Added project: %s', u'x', extra={'category': 'added project'})
+    logger.info(u'Finished.')
+
+
+def test_entries_are_summarised(capsys):
+    session = LogSession()
+    log_entries(3)
+    session.close()
+
+    err = capsys.readouterr().err
+    assert u'To be added' not in err
+    assert u'Added project: x' in err
+    assert u'Finished.' in err
+    assert u'     3 entries to be added to Timewax' in err
+    assert u'     1 projects added to Toggl' in err
+    # Per entry records that are not written are not formatted either.
+    assert Expensive.formatted == 0
+
+
+def test_verbose_shows_entries(capsys):
+    session = LogSession(verbose=True)
+    log_entries(2)
+    session.close()
+
+    err = capsys.readouterr().err
+    assert err.count(u'To be added: Expensive()') == 2
+    assert u'     2 entries to be added to Timewax' in err
+
+
+def test_no_summary_without_entries(capsys):
+    session = LogSession()
+    logger.info(u'Finished.')
+    session.close()
+
+    assert u'Summary' not in capsys.readouterr().err
+
+
+def test_close_restores_logging():
+    root = logging.getLogger()
+    handlers, level, own_level = root.handlers[:], root.level, logger.level
+
+    session = LogSession(verbose=True)
+    assert root.handlers == [session.handler]
+    session.close()
+
+    assert root.handlers == handlers
+    assert (root.level, logger.level) == (level, own_level)
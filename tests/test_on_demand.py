@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import arrow
+import pytest
+
+from toggl_timewax.catalog import CatalogMirror
+
+from tests.stubs import StubServices
+
+
+@pytest.fixture
+def services():
+    services = StubServices()
+    services.add_catalog(4, 3)
+    start = arrow.now().shift(days=-2)
+    for i, pid in enumerate(sorted(services.projects)):
+        services.add_time_entry(pid, start.shift(minutes=i))
+    # Not a Timewax project.
+    other = services.add_project(u'Lunch', services.add_client(u'Personal'))
+    services.add_time_entry(other, start)
+    return services
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    mirror = CatalogMirror(str(tmp_path / 'catalog.sqlite'))
+    yield mirror
+    mirror.close()
+
+
+def test_only_projects_of_entries_are_requested(services):
+    transport = services.transport()
+    toggl = services.toggl(transport, on_demand=True)
+
+    entries = list(toggl.get_recent_entries())
+
+    assert len(entries) == 12
+    assert transport.endpoint_counts['toggl.project'] == 13
+    assert transport.endpoint_counts['toggl.client'] == 5
+    assert transport.endpoint_counts['toggl.projects'] == 0
+    assert transport.endpoint_counts['toggl.clients'] == 0
+
+
+def test_entries_are_passed_on_while_streaming(services):
+    toggl = services.toggl(services.transport(), on_demand=True)
+    raw = [e for e in services.time_entries]
+    consumed = []
+
+    def stream():
+        for entry in raw:
+            consumed.append(entry)
+            yield entry
+
+    resolved = toggl._resolve_as_needed(stream(), batch_size=2)
+    first = next(resolved)
+
+    assert first is raw[0]
+    assert len(consumed) == 2
+    assert len(list(resolved)) == len(raw) - 1
+
+
+def test_known_projects_are_not_requested_again(services):
+    transport = services.transport()
+    toggl = services.toggl(transport, on_demand=True)
+    list(toggl.get_recent_entries())
+    n_requests = transport.request_count
+
+    list(toggl.get_recent_entries())
+    # Only the time entries themselves.
+    assert transport.request_count == n_requests + 1
+
+
+def test_mirror_is_used_before_requesting(services, mirror):
+    transport = services.transport()
+    toggl = services.toggl(transport, catalog=mirror)
+    assert toggl.clients
+
+    on_demand_transport = services.transport()
+    on_demand = services.toggl(on_demand_transport, catalog=mirror, on_demand=True)
+    assert len(list(on_demand.get_recent_entries())) == 12
+
+    # Including the project that is not from Timewax.
+    assert on_demand_transport.endpoint_counts['toggl.project'] == 0
+    assert on_demand_transport.endpoint_counts['toggl.me'] == 1
+
+
+def test_requested_projects_are_stored_in_mirror(services, mirror):
+    first = services.transport()
+    list(services.toggl(first, catalog=mirror, on_demand=True).get_recent_entries())
+    assert first.endpoint_counts['toggl.project'] == 13
+
+    second = services.transport()
+    assert len(list(services.toggl(second, catalog=mirror, on_demand=True).get_recent_entries())) == 12
+    # The project that is not from Timewax is known from the mirror as well.
+    assert second.endpoint_counts['toggl.project'] == 0
+    assert second.endpoint_counts['toggl.client'] == 0
+
+
+def test_first_on_demand_run_does_not_download_catalog(services, mirror):
+    transport = services.transport()
+    services.toggl(transport, catalog=mirror, on_demand=True)
+
+    me = [params for _, url, params in services.requests if url.endswith('/me')]
+    assert me == [{}]
+    assert mirror.load([1]) == ({}, {})
+
+
+def test_mirror_changes_are_applied_on_demand(services, mirror):
+    list(services.toggl(services.transport(), catalog=mirror, on_demand=True).get_recent_entries())
+
+    pid = sorted(services.projects)[0]
+    services.rename('projects', pid, u'009 - Moved')
+
+    transport = services.transport()
+    toggl = services.toggl(transport, catalog=mirror, on_demand=True)
+    entries = {e.pid: e for e in toggl.get_recent_entries()}
+
+    assert entries[pid].breakdown == u'009'
+    assert transport.endpoint_counts['toggl.project'] == 0
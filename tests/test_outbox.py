@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+
+from toggl_timewax import cli
+from toggl_timewax.main import TimeEntry
+from toggl_timewax.outbox import Outbox
+
+
+def entry(guid, duration=3600):
+    return TimeEntry(guid, description=u'work', duration=duration, start=u'2020-01-06T09:00:00+00:00',
+                     stop=u'2020-01-06T10:00:00+00:00', project=u'12345678', breakdown=u'001')
+
+
+class StubTimewax(object):
+
+    def __init__(self, present=None, accept=True):
+        self.client = u'ACME/Corp'
+        self.timewax_id = u'JDOE'
+        self.present = present or {}
+        self.accept = accept
+        self.sent = []
+
+    def get_entries(self, date_from, date_to):
+        return dict(self.present)
+
+    def add_entries(self, entries):
+        self.sent.append([(e.guid, e.duration) for e in entries])
+        return self.accept
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite'))
+    yield outbox
+    outbox.close()
+
+
+def pending_guids(outbox):
+    return sorted(guid for _, guid, _, _, _ in outbox.pending())
+
+
+def test_send_marks_done(outbox):
+    assert outbox.send(StubTimewax(), [entry('a'), entry('b')])
+    assert outbox.pending() == []
+
+
+def test_rejected_send_stays_pending(outbox):
+    assert not outbox.send(StubTimewax(accept=False), [entry('a'), entry('b')])
+    assert pending_guids(outbox) == ['a', 'b']
+
+
+def test_resume_sends_missing_duration(outbox):
+    outbox.send(StubTimewax(accept=False), [entry('a', 7200)], known={'a': entry('a', 3600)})
+
+    # Timewax has the first hour, the second never arrived.
+    timewax = StubTimewax(present={'a': entry('a', 3600)})
+    assert outbox.resume(timewax) == 1
+    assert timewax.sent == [[('a', 7200)]]
+    assert outbox.pending() == []
+
+
+def test_resume_nothing_missing(outbox):
+    outbox.send(StubTimewax(accept=False), [entry('a')])
+
+    timewax = StubTimewax(present={'a': entry('a')})
+    assert outbox.resume(timewax) == 0
+    assert timewax.sent == []
+    assert outbox.pending() == []
+
+
+def test_rejected_resume_does_not_pile_up(outbox):
+    outbox.send(StubTimewax(accept=False), [entry('a'), entry('b')])
+
+    for _ in range(3):
+        timewax = StubTimewax(accept=False)
+        assert outbox.resume(timewax) == 0
+        assert timewax.sent == [[('a', 3600), ('b', 3600)]]
+        # Only the latest batch is pending.
+        assert pending_guids(outbox) == ['a', 'b']
+        assert len({batch for batch, _, _, _, _ in outbox.pending()}) == 1
+
+
+class StubContext(object):
+
+    def __init__(self):
+        self.params = {'no_outbox': False}
+        self.closers = []
+
+    def call_on_close(self, f):
+        self.closers.append(f)
+
+
+def test_outbox_path_with_path_characters(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, 'DATA_DIR', str(tmp_path))
+    ctx = StubContext()
+
+    outbox = cli.get_outbox_from_ctx(ctx, StubTimewax())
+    assert os.path.dirname(outbox.path) == str(tmp_path)
+    assert outbox.send(StubTimewax(), [entry('a')])
+
+    for f in ctx.closers:
+        f()
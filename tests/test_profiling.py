@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import pstats
+import re
+import threading
+import time
+
+import pytest
+
+from toggl_timewax import profiling
+from toggl_timewax.main import TimeEntry
+from toggl_timewax.profiling import CommandProfiler
+from toggl_timewax.transport import Transport
+
+
+def busy_in_worker(seconds=0.3):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def test_default_profiler_sees_worker_threads(tmp_path):
+    path = str(tmp_path / 'profile')
+    profiler = CommandProfiler(path)
+    assert profiler.kind == 'sampling'
+
+    profiler.start()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(busy_in_worker).result()
+    summary = profiler.stop(Transport())
+
+    assert 'busy_in_worker' in {name for _, _, name in profiler.profiler.own}
+    assert 'Network wait' in summary
+    with open(path + '.txt') as f:
+        assert f.read().strip() == summary
+
+
+@pytest.mark.parametrize('cpu_clocks', [True, False])
+def test_waiting_threads_are_not_sampled(tmp_path, monkeypatch, cpu_clocks):
+    if not cpu_clocks:
+        monkeypatch.setattr(profiling, 'thread_cpu_time', lambda thread_id: None)
+    profiler = CommandProfiler(str(tmp_path / 'profile'))
+    idle = threading.Event()
+    waiter = threading.Thread(target=idle.wait)
+    waiter.start()
+
+    profiler.start()
+    # Two workers, one of which stays idle, and the main thread waits for the result.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(busy_in_worker).result()
+    profiler.stop()
+    idle.set()
+    waiter.join()
+
+    own = profiler.profiler.own
+    busy = sum(seconds for (_, _, name), seconds in own.items() if name == 'busy_in_worker')
+    assert busy > 0.8 * profiler.profiler.total
+
+
+def to_xml(n):
+    entry = TimeEntry(u'guid', duration=3600, start=u'2020-01-02T08:00:00+00:00',
+                      stop=u'2020-01-02T09:00:00+00:00', project=u'10000000', breakdown=u'001')
+    for _ in range(n):
+        entry.to_xml()
+
+
+def test_cprofile_summary(tmp_path):
+    profiler = CommandProfiler(str(tmp_path / 'profile'), 'cprofile')
+    profiler.start()
+    busy_in_worker(0.05)
+    to_xml(200)
+    summary = profiler.stop()
+
+    assert 'busy_in_worker' in summary
+    main_time = float(re.search(r'Time in main.py: +([0-9.]+) s', summary).group(1))
+    # Includes the arrow calls of to_xml, not just the own time of main.py functions.
+    stats = pstats.Stats(profiler.profiler).stats
+    own_main = sum(entry[2] for (filename, _, _), entry in stats.items() if filename.endswith('main.py'))
+    assert main_time > 2 * own_main
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import time
+
+from toggl_timewax.main import TimeEntry
+from toggl_timewax.reconcile import DiffPlan, Reconciler, compensation_entry, reconcile
+
+START = u'2020-01-06T09:00:00+00:00'
+STOP = u'2020-01-06T10:00:00+00:00'
+
+
+def entry(guid, duration=3600, stop=STOP):
+    return TimeEntry(guid, description=u'work', duration=duration, pid=1, start=START, stop=stop,
+                     project=u'12345678', breakdown=u'001')
+
+
+def test_categories():
+    timewax = {
+        'grown': entry('grown', 3600),
+        'shrunk': entry('shrunk', 3600),
+        'unchanged': entry('unchanged', 3600),
+        'orphaned': entry('orphaned', 3600),
+    }
+    toggl = [
+        entry('new'),
+        entry('grown', 7200),
+        entry('shrunk', 1800),
+        entry('unchanged', 3630),
+        entry('running', -1, stop=None),
+    ]
+
+    plan = reconcile(toggl, timewax)
+
+    assert plan.counts() == {'new': 1, 'grown': 1, 'shrunk': 1, 'unchanged': 1,
+                             'orphaned': 1, 'running': 1}
+    assert [e.guid for e in plan.new] == ['new']
+    assert [(t.guid, w.guid) for t, w in plan.grown] == [('grown', 'grown')]
+    assert [(t.guid, w.guid) for t, w in plan.shrunk] == [('shrunk', 'shrunk')]
+    assert [(t.guid, w.guid) for t, w in plan.unchanged] == [('unchanged', 'unchanged')]
+    assert [e.guid for e in plan.orphaned] == ['orphaned']
+    assert [e.guid for e in plan.running] == ['running']
+
+
+def test_threshold():
+    timewax = {'a': entry('a', 3600)}
+    assert Reconciler(timewax, threshold=60).feed(entry('a', 3660)) == 'unchanged'
+    assert Reconciler(timewax, threshold=60).feed(entry('a', 3661)) == 'grown'
+    assert Reconciler(timewax, threshold=60).feed(entry('a', 3539)) == 'shrunk'
+
+
+def test_compensation_entry():
+    toggl_entry = entry('a', 7200)
+    compensation = compensation_entry(toggl_entry, entry('a', 3600))
+
+    assert compensation is not toggl_entry
+    assert compensation.duration == 3600
+    assert toggl_entry.duration == 7200
+    for attribute in ('guid', 'description', 'pid', 'start', 'stop', 'project', 'breakdown'):
+        assert getattr(compensation, attribute) == getattr(toggl_entry, attribute)
+
+
+def test_iter_uploads():
+    timewax = {'grown': entry('grown', 3600), 'unchanged': entry('unchanged', 3600)}
+    reconciler = Reconciler(timewax)
+    toggl = iter([entry('new'), entry('grown', 5400), entry('unchanged'), entry('running', stop=None)])
+
+    uploads = reconciler.iter_uploads(toggl)
+    first = next(uploads)
+    assert first.guid == 'new'
+    # Entries are classified as they are consumed.
+    assert reconciler.plan.counts()['grown'] == 0
+
+    rest = list(uploads)
+    assert [(e.guid, e.duration) for e in rest] == [('grown', 1800)]
+
+    plan = reconciler.finish()
+    assert plan.counts()['running'] == 1
+    assert plan.orphaned == []
+
+
+def test_entries_to_upload():
+    plan = DiffPlan()
+    plan.new.append(entry('new'))
+    plan.grown.append((entry('grown', 7200), entry('grown', 3600)))
+    assert [(e.guid, e.duration) for e in plan.entries_to_upload()] == [('new', 3600), ('grown', 3600)]
+
+
+def test_benchmark_500k_entries_per_side():
+    n = 500000
+    timewax = {}
+    toggl = []
+    for i in range(n):
+        guid = 'guid-%d' % i
+        timewax[guid] = TimeEntry(guid, duration=3600, start=START, stop=STOP)
+        # Every fourth entry is new in Toggl, every fourth has grown.
+        if i % 4 == 0:
+            guid = 'new-%d' % i
+        toggl.append(TimeEntry(guid, duration=7200 if i % 4 == 1 else 3600, start=START, stop=STOP))
+
+    start = time.time()
+    plan = reconcile(toggl, timewax)
+    uploads = plan.entries_to_upload()
+    elapsed = time.time() - start
+
+    assert plan.counts() == {'new': n // 4, 'grown': n // 4, 'shrunk': 0, 'unchanged': n // 2,
+                             'orphaned': n // 4, 'running': 0}
+    assert len(uploads) == n // 2
+    # A single pass over both sides; a quadratic comparison would take hours.
+    assert elapsed < 10, 'Reconciling %s entries per side took %.1f s' % (n, elapsed)
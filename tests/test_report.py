@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+from xml.etree import ElementTree
+import random
+import time
+
+import arrow
+import pytest
+
+from toggl_timewax import report
+from toggl_timewax.main import TimeEntry
+from toggl_timewax.report import HoursReport, TIMEWAX, TOGGL, UNTRACKED
+
+from tests.stubs import StubServices
+
+
+def make_entry(day, hours, project=u'10000000', breakdown=u'001', guid=u'guid'):
+    return TimeEntry(guid, duration=hours * 3600, start=u'%sT09:00:00+00:00' % day,
+                     project=project, breakdown=breakdown)
+
+
+def team_year(n_entries, seed=1):
+    """ Entries of a team over a year, a mix of projects and breakdowns. """
+    rng = random.Random(seed)
+    start = arrow.get('2020-01-01')
+    return [TimeEntry(u'guid-%s' % i, duration=rng.choice([900, 1800, 3600, 7200]),
+                      start=start.shift(days=rng.randrange(365), hours=8).isoformat(),
+                      project=u'%08d' % (10000000 + rng.randrange(20)),
+                      breakdown=u'%03d' % rng.randrange(10))
+            for i in range(n_entries)]
+
+
+def test_rows_and_discrepancies():
+    hours_report = HoursReport()
+    hours_report.add_entries([make_entry('2020-01-02', 2), make_entry('2020-01-02', 1),
+                              make_entry('2020-01-03', 4)], TOGGL)
+    hours_report.add_entries([make_entry('2020-01-02', 3), make_entry('2020-01-03', 2)], TIMEWAX)
+
+    assert hours_report.rows() == [(u'10000000', u'001', u'2020-01-02', 3.0, 3.0),
+                                   (u'10000000', u'001', u'2020-01-03', 4.0, 2.0)]
+    assert hours_report.rows(discrepancies_only=True) == [(u'10000000', u'001', u'2020-01-03', 4.0, 2.0)]
+
+
+def test_weeks():
+    hours_report = HoursReport('week')
+    hours_report.add_entries([make_entry('2019-12-30', 1), make_entry('2020-01-05', 1),
+                              make_entry('2020-01-06', 1)], TOGGL)
+
+    assert [(period, hours) for _, _, period, hours, _ in hours_report.rows()] == \
+        [(u'2020-W01', 2.0), (u'2020-W02', 1.0)]
+
+
+def test_sources_are_clipped_to_the_same_days():
+    hours_report = HoursReport(since='2020-01-02', until='2020-01-03')
+    hours_report.add_entries([make_entry('2020-01-01', 1), make_entry('2020-01-02', 1),
+                              make_entry('2020-01-04', 1)], TOGGL)
+    hours_report.add_entries([make_entry('2020-01-01', 8), make_entry('2020-01-02', 1),
+                              make_entry('2020-01-03', 8)], TIMEWAX)
+
+    assert hours_report.rows() == [(u'10000000', u'001', u'2020-01-02', 1.0, 1.0),
+                                   (u'10000000', u'001', u'2020-01-03', 0.0, 8.0)]
+
+
+def test_timewax_entries_without_guid_are_untracked():
+    services = StubServices()
+    for description in (u'work ID:guid-1', u'Entered by hand'):
+        services.timewax_entries.append(ElementTree.fromstring(
+            u'<timeline><description>%s</description><project>10000000</project>'
+            u'<breakdown>001</breakdown><hours>2.0</hours><date>20200102</date></timeline>' % description))
+    timewax = services.timewax(services.transport())
+
+    entries = timewax.list_entries(u'20200101', u'20200103')
+    assert [e.guid for e in entries] == [u'guid-1', None]
+    assert list(timewax.get_entries(u'20200101', u'20200103')) == [u'guid-1']
+
+    hours_report = HoursReport()
+    hours_report.add_entries([make_entry('2020-01-02', 2, guid=u'guid-1')], TOGGL)
+    hours_report.add_entries(entries, TIMEWAX)
+
+    assert hours_report.rows(discrepancies_only=True) == [(u'10000000', UNTRACKED, u'2020-01-02', 0.0, 2.0)]
+
+
+def test_numpy_and_pure_python_totals_are_equal(monkeypatch):
+    pytest.importorskip('numpy')
+    entries = team_year(5000)
+
+    hours_report = HoursReport('week')
+    hours_report.add_entries(entries[:3000], TOGGL)
+    hours_report.add_entries(entries[2000:], TIMEWAX)
+    with_numpy = hours_report.rows()
+
+    monkeypatch.setattr(report, 'numpy', None)
+    assert hours_report.rows() == with_numpy
+
+
+def test_team_year_well_under_a_second():
+    # Ten people, 220 working days, ten entries a day, for each source.
+    entries = team_year(22000)
+
+    start = time.time()
+    hours_report = HoursReport()
+    hours_report.add_entries(entries, TOGGL)
+    hours_report.add_entries(entries, TIMEWAX)
+    hours_report.format(discrepancies_only=True)
+
+    assert time.time() - start < 0.5
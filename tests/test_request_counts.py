@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Requests made by the sync functions for catalogs of known size. A change in
+these numbers means a change in call volume against Toggl and Timewax.
+"""
+from __future__ import absolute_import, division, print_function
+
+import arrow
+from click.testing import CliRunner
+import pytest
+
+from toggl_timewax import cli
+from toggl_timewax.cli import sync_to_timewax, sync_to_toggl
+from toggl_timewax.concurrency import RateLimiter
+from toggl_timewax.transport import BudgetExceeded, RequestBudget, Transport
+
+from tests.stubs import StubServices
+
+N_CLIENTS = 3
+N_PROJECTS = 4
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(RateLimiter, 'wait', lambda self: None)
+
+
+def connect(services, command, **kwargs):
+    transport = services.transport(**kwargs)
+    transport.command = command
+    return transport, services.toggl(transport), services.timewax(transport)
+
+
+def counts(transport):
+    return {endpoint: count for (_, endpoint), count in transport.counts.items()}
+
+
+def test_to_toggl_empty_toggl():
+    services = StubServices()
+    services.add_catalog(N_CLIENTS, N_PROJECTS, in_toggl=False)
+
+    transport, toggl, timewax = connect(services, 'to_toggl')
+    assert sync_to_toggl(toggl, timewax) == []
+
+    n = N_CLIENTS * N_PROJECTS
+    assert counts(transport) == {
+        'timewax.token': 1,
+        'toggl.workspaces': 1,
+        'toggl.clients': 1,
+        'toggl.projects': 1,
+        'timewax.projects': 1,
+        'timewax.breakdowns': N_CLIENTS,
+        'timewax.authorization': n,
+        'toggl.add_client': N_CLIENTS,
+        'toggl.add_project': n,
+    }
+    assert set(transport.counts) == {('to_toggl', endpoint) for endpoint in counts(transport)}
+    assert len(services.projects) == n
+
+
+def test_to_toggl_up_to_date():
+    services = StubServices()
+    services.add_catalog(N_CLIENTS, N_PROJECTS)
+
+    transport, toggl, timewax = connect(services, 'to_toggl')
+    sync_to_toggl(toggl, timewax)
+
+    assert counts(transport) == {
+        'timewax.token': 1,
+        'toggl.workspaces': 1,
+        'toggl.clients': 1,
+        'toggl.projects': 1,
+        'timewax.projects': 1,
+        'timewax.breakdowns': N_CLIENTS,
+    }
+
+
+def add_recent_entries(services, n):
+    start = arrow.now().shift(days=-3)
+    pids = sorted(services.projects)
+    for i in range(n):
+        services.add_time_entry(pids[i % len(pids)], start.shift(minutes=i), 60 * 30)
+
+
+@pytest.mark.parametrize('pipelined, n_adds', [(False, 1), (True, 3)])
+def test_to_timewax(pipelined, n_adds):
+    services = StubServices()
+    services.add_catalog(N_CLIENTS, N_PROJECTS)
+    add_recent_entries(services, 120)
+
+    transport, toggl, timewax = connect(services, 'to_timewax')
+    sync_to_timewax(toggl, timewax, pipelined=pipelined)
+
+    assert counts(transport) == {
+        'timewax.token': 1,
+        'toggl.workspaces': 1,
+        'toggl.clients': 1,
+        'toggl.projects': 1,
+        'timewax.entries_list': 1,
+        'toggl.time_entries': 1,
+        # Batches of 50 when pipelined.
+        'timewax.entries_add': n_adds,
+    }
+    assert len(services.timewax_entries) == 120
+
+    # Nothing left to send the second time.
+    transport, toggl, timewax = connect(services, 'to_timewax')
+    sync_to_timewax(toggl, timewax, pipelined=pipelined)
+    assert 'timewax.entries_add' not in counts(transport)
+
+
+def test_endpoint_budget_stops_at_limit():
+    services = StubServices()
+    services.add_catalog(N_CLIENTS, N_PROJECTS, in_toggl=False)
+
+    budget = RequestBudget(per_endpoint={'toggl.add_project': 5})
+    transport, toggl, timewax = connect(services, 'to_toggl', budget=budget)
+
+    with pytest.raises(BudgetExceeded):
+        sync_to_toggl(toggl, timewax)
+
+    assert counts(transport)['toggl.add_project'] == 5
+    assert len(services.projects) == 5
+
+    # Everything after the limit is refused.
+    with pytest.raises(BudgetExceeded):
+        transport.check()
+
+
+def test_total_budget_stops_at_limit():
+    services = StubServices()
+    services.add_catalog(N_CLIENTS, N_PROJECTS, in_toggl=False)
+
+    # Enough to connect and to list, not to check authorization of every breakdown.
+    transport, toggl, timewax = connect(services, 'to_toggl', budget=RequestBudget(max_requests=10))
+
+    with pytest.raises(BudgetExceeded):
+        sync_to_toggl(toggl, timewax)
+
+    assert transport.request_count == 10
+    assert services.clients == {}
+
+
+@pytest.fixture
+def run_cli(tmp_path, monkeypatch):
+    services = StubServices()
+    transports = []
+
+    class StubTransport(Transport):
+        def __init__(self, *args, **kwargs):
+            super(StubTransport, self).__init__(*args, **kwargs)
+            self.session = services
+            transports.append(self)
+
+    monkeypatch.setattr(cli, 'Transport', StubTransport)
+    monkeypatch.setattr(cli, 'DATA_DIR', str(tmp_path))
+
+    def run(*args):
+        result = CliRunner().invoke(cli.cli, list(args) + [
+            '--no-config', '--no-cache', '--no-catalog-mirror', '--cache-dir', str(tmp_path),
+            '-u', 'JDOE', '-p', 'password', '-c', 'ACME', '-k', 'key'])
+        return result, transports[-1]
+
+    return services, run
+
+
+def test_sync_counts_per_step(run_cli):
+    services, run = run_cli
+    services.add_catalog(N_CLIENTS, N_PROJECTS, in_toggl=False)
+
+    result, transport = run('sync')
+    assert result.exit_code == 0, result.output
+
+    steps = {}
+    for (command, endpoint), count in transport.counts.items():
+        steps.setdefault(command, {})[endpoint] = count
+
+    assert steps['to_toggl']['toggl.add_project'] == N_CLIENTS * N_PROJECTS
+    # Projects created in the first step are known to the second one.
+    assert set(steps['to_timewax']) == {'timewax.entries_list', 'toggl.time_entries'}
+    assert steps['sync'] == {'timewax.token': 1, 'toggl.workspaces': 1,
+                             'toggl.clients': 1, 'toggl.projects': 1}
+
+
+def test_sync_stops_on_budget(run_cli):
+    services, run = run_cli
+    services.add_catalog(N_CLIENTS, N_PROJECTS, in_toggl=False)
+
+    result, transport = run('sync', '--max-endpoint-requests', 'timewax.authorization=2')
+
+    assert result.exit_code == 2
+    assert transport.endpoint_counts['timewax.authorization'] == 2
+    assert 'toggl.add_project' not in transport.endpoint_counts
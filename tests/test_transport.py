@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import threading
+import time
+
+import pytest
+import requests
+
+from toggl_timewax.cli import get_timeouts
+from toggl_timewax.jsonstream import iter_json_array
+from toggl_timewax.transport import Deadline, DeadlineExceeded, Transport
+
+# Python 2/3 compatibility
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """ Answers after the number of seconds in the path, e.g. /2.5. """
+
+    def do_GET(self):
+        if self.path.startswith('/trickle'):
+            return self.trickle()
+        try:
+            time.sleep(float(self.path.strip('/')))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'[]')
+        except Exception:
+            # The client gave up.
+            pass
+
+    def trickle(self):
+        """ A JSON array of five elements, one every 0.1 second. """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'[')
+        for i in range(5):
+            self.wfile.write((u'%s%s' % (i, u',' if i < 4 else u']')).encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(0.1)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_server():
+    server = ThreadingServer(('127.0.0.1', 0), SlowHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:%s' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def test_fast_response(slow_server):
+    transport = Transport(deadline=Deadline(5))
+    assert transport.get(slow_server + '/0', 'stub').json() == []
+    assert transport.request_count == 1
+
+
+def test_read_timeout_per_endpoint(slow_server):
+    transport = Transport({'stub.slow': (1, 0.5)})
+
+    start = time.time()
+    with pytest.raises(requests.Timeout):
+        transport.get(slow_server + '/3', 'stub.slow')
+    assert time.time() - start < 2
+
+
+def test_deadline_cuts_off_slow_response(slow_server):
+    transport = Transport(deadline=Deadline(1))
+
+    start = time.time()
+    with pytest.raises(DeadlineExceeded):
+        transport.get(slow_server + '/3', 'stub')
+    assert time.time() - start < 2
+
+    # No new requests once the deadline has passed.
+    with pytest.raises(DeadlineExceeded):
+        transport.get(slow_server + '/0', 'stub')
+
+
+def test_timeout_capped_by_deadline():
+    transport = Transport({'default': (5, 30)}, Deadline(2))
+    connect, read = transport.timeout_for('stub')
+    assert 0 < connect <= 2 and 0 < read <= 2
+
+
+def test_no_zero_timeout_after_deadline():
+    deadline = Deadline(1)
+    deadline.expires = time.time() - 1
+    with pytest.raises(DeadlineExceeded):
+        Transport(deadline=deadline).timeout_for('stub')
+
+
+def test_timeouts_from_config():
+    config = {'timeouts': {'default': [2, 10], 'toggl.time_entries': [5, 60]}}
+
+    assert get_timeouts(config) == {'default': (2, 10), 'toggl.time_entries': (5, 60)}
+    assert get_timeouts(config, read_timeout=20)['default'] == (2, 20)
+    assert get_timeouts({})['default'] == Transport.DEFAULT_TIMEOUT
+    assert get_timeouts({}, 1, 2)['default'] == (1, 2)
+
+
+def test_streamed_body_counts_as_network_time(slow_server):
+    transport = Transport()
+    r = transport.get(slow_server + '/trickle', 'stub', stream=True)
+    try:
+        assert list(iter_json_array(r)) == [0, 1, 2, 3, 4]
+    finally:
+        r.close()
+
+    # The headers arrive at once, the body takes about half a second.
+    assert transport.network_time > 0.3
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function
+
+import arrow
+import pytest
+
+from toggl_timewax.main import Toggl
+
+from tests.stubs import StubServices
+
+
+@pytest.fixture
+def services():
+    services = StubServices()
+    services.workspaces = [{'id': 1, 'name': u'Work'}, {'id': 2, 'name': u'Work archive'},
+                           {'id': 3, 'name': u'Private'}]
+
+    start = arrow.now().shift(days=-1)
+    for wid in (1, 2, 3):
+        cid = services.add_client(u'1000000%s - Project %s' % (wid, wid), wid=wid)
+        pid = services.add_project(u'00%s - Breakdown %s' % (wid, wid), cid, wid=wid)
+        services.add_time_entry(pid, start.shift(minutes=wid), wid=wid)
+    return services
+
+
+def make_toggl(services, workspace_name):
+    return Toggl(u'key', workspace_name, transport=services.transport())
+
+
+@pytest.mark.parametrize('workspace_name, wids', [
+    (None, [1]),
+    (u'Work', [1, 2]),
+    (u'archive, Private', [2, 3]),
+    (u' Private ,,', [3]),
+    ([u'Private', u'archive'], [2, 3]),
+])
+def test_workspace_names(services, workspace_name, wids):
+    assert list(make_toggl(services, workspace_name).workspaces) == wids
+
+
+def test_no_matching_workspace(services):
+    with pytest.raises(SystemExit):
+        make_toggl(services, u'Holiday')
+
+
+def test_catalogs_of_workspaces_are_merged(services):
+    toggl = make_toggl(services, u'Work')
+
+    assert sorted(c.timewax_code for c in toggl.clients.values()) == [u'10000001', u'10000002']
+    pids = sorted(pid for projects in toggl.projects.values() for pid in projects)
+    assert [toggl.get_timewax_project_breakdown(pid) for pid in pids] == \
+        [(u'10000001', u'001'), (u'10000002', u'002')]
+
+
+def test_entries_are_filtered_by_workspace(services):
+    toggl = make_toggl(services, u'archive, Private')
+
+    assert sorted(e.wid for e in toggl.get_recent_entries()) == [2, 3]
+
+
+def test_projects_are_created_in_workspace_of_client(services):
+    toggl = make_toggl(services, u'Work')
+    archived = [cid for cid, c in toggl.clients.items() if c.wid == 2][0]
+
+    pid = toggl.add_project(archived, u'009 - New')
+    client_id = toggl.add_client(u'10000009 - New client')
+
+    assert services.projects[pid]['wid'] == 2
+    # New clients go into the first workspace.
+    assert services.clients[client_id]['wid'] == 1
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Toggl time entries for long periods, from the detailed reports API. """
+
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+import threading
+
+import arrow
+
+from toggl_timewax.concurrency import DEFAULT_WORKERS, RateLimiter
+from toggl_timewax.main import Timewax
+
+logger = logging.getLogger('toggl-timewax')
+
+
+class ReportsBackfill(object):
+    """
+    Source of Toggl time entries for long periods in the past, using the paginated
+    detailed report of the Toggl reports API. Reports are filtered server side to the
+    current user and to Toggl projects with Timewax codes, and pages are fetched in
+    parallel.
+
+    Report rows do not carry the GUID that links entries to Timewax, so for every
+    page the entries in its time span are also requested from the time entries
+    endpoint and matched on identifier. That endpoint returns a limited number of
+    entries, so the span is split until every part is below the limit. Rows that
+    cannot be matched are kept in self.unmatched.
+    """
+
+    DETAILS = 'https://toggl.com/reports/api/v2/details'
+    USER_AGENT = 'toggl-timewax'
+    DATE_FORMAT = 'YYYY-MM-DD'
+
+    # The reports API does not accept longer periods in one request.
+    MAX_DAYS = 365
+    # Project identifiers per request, to keep urls within limits.
+    MAX_PROJECTS = 100
+    # Entries returned by one request to the time entries endpoint, at most.
+    TIME_ENTRIES_LIMIT = 1000
+
+    def __init__(self, toggl, since, until=None, max_workers=DEFAULT_WORKERS, calls_per_second=1):
+        """
+        :param toggl: Toggl object, with clients and projects loaded.
+        :param since: first day to get entries for, anything arrow can parse.
+        :param until: last day to get entries for (default: today).
+        :param int max_workers: pages fetched at the same time.
+        :param calls_per_second: rate limit for the reports API.
+        """
+        self.toggl = toggl
+        self.since = arrow.get(since).floor('day')
+        self.until = arrow.get(until).floor('day') if until else arrow.now().floor('day')
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(calls_per_second)
+        self._user_id = None
+
+        # Report rows without a matching time entry, these are not sent to Timewax.
+        self.unmatched = []
+        self._lock = threading.Lock()
+
+    @property
+    def timewax_range(self):
+        """ (date_from, date_to) for Timewax.get_entries, a day wider on both sides for time zones. """
+        return (self.since.shift(days=-1).format(Timewax.DATE_FORMAT),
+                self.until.shift(days=1).format(Timewax.DATE_FORMAT))
+
+    @property
+    def user_id(self):
+        if self._user_id is None:
+            r = self.toggl.transport.get(self.toggl.ME, 'toggl.me', auth=self.toggl.auth)
+            self._user_id = r.json().get('data', {}).get('id')
+        return self._user_id
+
+    def project_ids(self):
+        """
+        :return dict: workspace identifiers as keys, lists of Timewax coded project identifiers as values.
+        """
+        by_workspace = {}
+        for client_id, projects in self.toggl.projects.items():
+            client = self.toggl.clients.get(client_id)
+            if client is None:
+                continue
+            for pid, project in projects.items():
+                # get_all_projects keeps projects without a Timewax code as None.
+                if project is None:
+                    continue
+                wid = getattr(project, 'wid', None) or client.wid or self.toggl.wid
+                by_workspace.setdefault(wid, []).append(pid)
+        return by_workspace
+
+    def project_chunks(self):
+        """ (wid, pids) pairs with at most MAX_PROJECTS project identifiers each. """
+        for wid, pids in sorted(self.project_ids().items()):
+            pids = sorted(pids)
+            for i in range(0, len(pids), self.MAX_PROJECTS):
+                yield wid, pids[i:i + self.MAX_PROJECTS]
+
+    def windows(self):
+        """ (since, until) pairs that each fit in a single report request. """
+        start = self.since
+        while start <= self.until:
+            end = min(start.shift(days=self.MAX_DAYS - 1), self.until)
+            yield start, end
+            start = end.shift(days=1)
+
+    def fetch_page(self, wid, pids, since, until, page):
+        """
+        Fetch one page of the detailed report.
+
+        :return dict: decoded report response.
+        """
+        params = {
+            'workspace_id': wid,
+            'since': since.format(self.DATE_FORMAT),
+            'until': until.format(self.DATE_FORMAT),
+            'user_agent': self.USER_AGENT,
+            'user_ids': self.user_id,
+            'project_ids': u','.join(u'%s' % pid for pid in pids),
+            'order_field': 'date',
+            'order_desc': 'off',
+            'page': page,
+        }
+        with self.rate_limiter:
+            r = self.toggl.transport.get(self.DETAILS, 'toggl.reports', params=params, auth=self.toggl.auth)
+        return r.json()
+
+    def page_entries(self, report):
+        """
+        Match the rows of a report page with time entries, which have GUIDs.
+
+        :param dict report: decoded report page.
+        :return list: TimeEntry objects.
+        """
+        rows = report.get('data') or []
+        if not rows:
+            return []
+
+        start = min(arrow.get(row.get('start')) for row in rows)
+        end = max(arrow.get(row.get('end') or row.get('start')) for row in rows)
+        by_id = self.time_entries(start, end.shift(seconds=1))
+
+        entries = []
+        unmatched = []
+        for row in rows:
+            entry = by_id.get(row.get('id'))
+            time_entry = self.toggl.entry_from_json(entry) if entry is not None else None
+            if time_entry is None:
+                unmatched.append(row)
+            else:
+                entries.append(time_entry)
+
+        if unmatched:
+            logger.warning(u'%s report rows between %s and %s could not be matched to time entries.',
+                           len(unmatched), start, end)
+            with self._lock:
+                self.unmatched.extend(unmatched)
+        return entries
+
+    def time_entries(self, start, end):
+        """
+        Time entries that start between start and end. The span is split in halves
+        as long as a request returns as many entries as the endpoint allows.
+
+        :param start: arrow object.
+        :param end: arrow object.
+        :return dict: time entry identifiers as keys and decoded time entries as values.
+        """
+        params = {'start_date': start.isoformat(), 'end_date': end.isoformat()}
+        entries = list(self.toggl.iter_json(self.toggl.TIME_ENTRIES, 'toggl.time_entries', params=params))
+
+        if len(entries) >= self.TIME_ENTRIES_LIMIT and end > start.shift(seconds=1):
+            middle = start + (end - start) // 2
+            by_id = self.time_entries(start, middle)
+            by_id.update(self.time_entries(middle, end))
+            return by_id
+
+        return {entry.get('id'): entry for entry in entries}
+
+    def _fetch_entries(self, request):
+        return self.page_entries(self.fetch_page(*request))
+
+    def iter_entries(self):
+        """
+        Yield TimeEntry objects for the whole period, in order of date per workspace.
+
+        :return: generator of TimeEntry objects.
+        """
+        logger.info(u'Getting Toggl report entries from %s until %s.',
+                    self.since.format(self.DATE_FORMAT), self.until.format(self.DATE_FORMAT))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for wid, pids in self.project_chunks():
+                for since, until in self.windows():
+                    first = self.fetch_page(wid, pids, since, until, 1)
+                    for entry in self.page_entries(first):
+                        yield entry
+
+                    per_page = first.get('per_page') or 50
+                    n_pages = int(math.ceil((first.get('total_count') or 0) / per_page))
+
+                    pages = [(wid, pids, since, until, page) for page in range(2, n_pages + 1)]
+                    for entries in executor.map(self._fetch_entries, pages):
+                        for entry in entries:
+                            yield entry
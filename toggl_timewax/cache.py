@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Disk cache for Timewax project and breakdown listings. """
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('toggl-timewax')
+
+# Python 2/3 compatibility
+try:
+    _replace = os.replace
+except AttributeError:
+    _replace = os.rename
+
+
+def _write_json(path, data):
+    """ Write JSON to a temporary file first, so readers never see a partial file. """
+    tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    _replace(tmp_path, path)
+
+
+class ResponseCache(object):
+    """
+    Disk cache for API responses with a time to live and least recently used
+    eviction once more than max_entries are stored. Every entry is a separate
+    file, written atomically, so a directory can be shared by several users
+    and processes on the same machine.
+    """
+
+    DEFAULT_TTL = 4 * 60 * 60
+    DEFAULT_MAX_ENTRIES = 1000
+    STATS_FILE = 'stats.json'
+
+    def __init__(self, directory, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param str directory: directory to store cached responses in.
+        :param int ttl: seconds before an entry expires.
+        :param int max_entries: number of entries kept before the least recently used are evicted.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def _entry_paths(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith('.json') and name != self.STATS_FILE]
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """
+        Get a cached value.
+
+        :param str key: cache key.
+        :return: the value, or None if missing or expired.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            self._count(hit=False)
+            return None
+
+        if entry.get('key') != key or time.time() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        # Modification time is used to track recent use for eviction.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self._count(hit=True)
+        return entry.get('value')
+
+    def set(self, key, value):
+        """
+        Store a value and evict the least recently used entries if the cache is full.
+
+        :param str key: cache key.
+        :param value: JSON serializable value.
+        """
+        _write_json(self._path(key), {'key': key, 'created': time.time(), 'value': value})
+        self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        paths = self._entry_paths()
+        if len(paths) <= self.max_entries:
+            return
+
+        def last_used(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        paths.sort(key=last_used)
+        for path in paths[:len(paths) - self.max_entries]:
+            self._remove(path)
+
+    def invalidate(self, prefix=u''):
+        """
+        Remove entries whose key starts with prefix, or all entries without a prefix.
+
+        :param str prefix: key prefix, e.g. 'timewax/<client>/'.
+        :return int: number of entries removed.
+        """
+        removed = 0
+        for path in self._entry_paths():
+            if prefix:
+                try:
+                    with open(path, 'r') as f:
+                        key = json.load(f).get('key', u'')
+                except (IOError, OSError, ValueError):
+                    key = u''
+                if not key.startswith(prefix):
+                    continue
+
+            self._remove(path)
+            removed += 1
+        return removed
+
+    def read_stats(self):
+        """ Hits and misses accumulated over all runs that used this directory. """
+        try:
+            with open(os.path.join(self.directory, self.STATS_FILE), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def flush_stats(self):
+        """
+        Add hits and misses of this run to the statistics on disk. Concurrent
+        runs may overwrite each other's update; statistics are best effort.
+        """
+        stats = self.read_stats()
+        stats['hits'] = stats.get('hits', 0) + self.hits
+        stats['misses'] = stats.get('misses', 0) + self.misses
+        self.hits = self.misses = 0
+
+        _write_json(os.path.join(self.directory, self.STATS_FILE), stats)
+
+    def info(self):
+        """
+        :return dict: number of entries, their size in bytes and cumulative hits and misses.
+        """
+        paths = self._entry_paths()
+        stats = self.read_stats()
+        stats['hits'] = stats.get('hits', 0) + self.hits
+        stats['misses'] = stats.get('misses', 0) + self.misses
+        stats.update({
+            'entries': len(paths),
+            'bytes': sum(os.path.getsize(p) for p in paths if os.path.exists(p)),
+            'directory': self.directory,
+            'ttl': self.ttl,
+        })
+        return stats
+
+    def close(self):
+        """ Log statistics for this run and persist them. """
+        if self.hits or self.misses:
+            logger.info(u'Response cache: %s hits, %s misses.', self.hits, self.misses)
+            self.flush_stats()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Local SQLite mirror of Toggl clients and projects. """
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+import os
+import sqlite3
+import threading
+
+from toggl_timewax.main import ClientProject, ProjectBreakdown, EntryMismatchException
+
+logger = logging.getLogger('toggl-timewax')
+
+
+class CatalogMirror(object):
+    """
+    Local SQLite copy of Toggl clients and projects, including the Timewax codes
+    parsed from their names. After a first full download it is kept up to date
+    with only the objects that changed since the previous refresh.
+    """
+
+    SCHEMA = u"""
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY,
+            wid INTEGER,
+            name TEXT,
+            timewax_code TEXT,
+            timewax_name TEXT
+        );
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY,
+            wid INTEGER,
+            cid INTEGER,
+            name TEXT,
+            timewax_code TEXT,
+            timewax_name TEXT
+        );
+        CREATE INDEX IF NOT EXISTS projects_wid ON projects (wid);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            wid INTEGER PRIMARY KEY,
+            since INTEGER
+        );
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: location of the SQLite database, created if it does not exist.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+    def since(self, wids):
+        """
+        Timestamp of the last refresh that covered all workspaces, or None
+        if any of them has not been downloaded before.
+
+        :param wids: workspace identifiers.
+        :return int: unix timestamp or None.
+        """
+        timestamps = []
+        for wid in wids:
+            row = self.connection.execute(
+                u'SELECT since FROM sync_state WHERE wid = ?', (wid,)).fetchone()
+            if row is None:
+                return None
+            timestamps.append(row[0])
+        return min(timestamps) if timestamps else None
+
+    def refresh(self, toggl, download=True):
+        """
+        Download clients and projects changed since the last refresh, or all
+        of them the first time, for the workspaces of toggl.
+
+        :param toggl: Toggl object.
+        :param download: when False and the mirror has not been refreshed before,
+            nothing is downloaded. Only the moment from which changes are downloaded
+            next time is recorded, for objects that are stored one by one.
+        """
+        wids = list(toggl.workspaces)
+        since = self.since(wids)
+
+        params = {}
+        if since:
+            params = {'with_related_data': 'true', 'since': since}
+        elif download:
+            params = {'with_related_data': 'true'}
+
+        r = toggl.transport.get(toggl.ME, 'toggl.me', params=params, auth=toggl.auth)
+        body = r.json()
+        data = body.get('data') or {}
+
+        def relevant(obj):
+            return obj.get('wid') in toggl.workspaces or obj.get('server_deleted_at')
+
+        clients = [c for c in data.get('clients') or [] if relevant(c)]
+        projects = [p for p in data.get('projects') or [] if relevant(p)]
+
+        with self._lock, self.connection:
+            for client in clients:
+                self._store_client(client)
+            for project in projects:
+                self._store_project(project)
+            self.connection.executemany(
+                u'INSERT OR REPLACE INTO sync_state (wid, since) VALUES (?, ?)',
+                [(wid, body.get('since')) for wid in wids])
+
+        if params:
+            logger.info(u'Toggl catalog %s: %s clients and %s projects changed.',
+                        u'updated' if since else u'downloaded', len(clients), len(projects))
+        else:
+            logger.info(u'Toggl catalog: changes are tracked from now on.')
+
+    def _store_client(self, json_data):
+        if json_data.get('server_deleted_at'):
+            self.connection.execute(u'DELETE FROM clients WHERE id = ?', (json_data.get('id'),))
+            return
+
+        try:
+            client = ClientProject.from_toggl(json_data)
+            code, name = client.timewax_code, client.name
+        except EntryMismatchException:
+            code = name = None
+
+        self.connection.execute(
+            u'INSERT OR REPLACE INTO clients (id, wid, name, timewax_code, timewax_name) '
+            u'VALUES (?, ?, ?, ?, ?)',
+            (json_data.get('id'), json_data.get('wid'), json_data.get('name'), code, name))
+
+    def _store_project(self, json_data):
+        if json_data.get('server_deleted_at'):
+            self.connection.execute(u'DELETE FROM projects WHERE id = ?', (json_data.get('id'),))
+            return
+
+        project = ProjectBreakdown.from_toggl(json_data)
+        code, name = (project.timewax_code, project.name) if project else (None, None)
+
+        self.connection.execute(
+            u'INSERT OR REPLACE INTO projects (id, wid, cid, name, timewax_code, timewax_name) '
+            u'VALUES (?, ?, ?, ?, ?, ?)',
+            (json_data.get('id'), json_data.get('wid'), json_data.get('cid'),
+             json_data.get('name'), code, name))
+
+    def store_client(self, json_data):
+        """ Store a client that was just created in Toggl. """
+        with self._lock, self.connection:
+            self._store_client(json_data)
+
+    def store_project(self, json_data):
+        """ Store a project that was just created in Toggl. """
+        with self._lock, self.connection:
+            self._store_project(json_data)
+
+    def load(self, wids):
+        """
+        Read clients and projects with Timewax codes in the same form as
+        Toggl.get_all_clients and Toggl.get_all_projects return them.
+
+        :param wids: workspace identifiers.
+        :return tuple: (clients, projects) dictionaries.
+        """
+        wids = list(wids)
+        placeholders = u', '.join(u'?' * len(wids))
+
+        clients = {}
+        for id_, wid, code, name in self.connection.execute(
+                u'SELECT id, wid, timewax_code, timewax_name FROM clients '
+                u'WHERE timewax_code IS NOT NULL AND wid IN (%s)' % placeholders, wids):
+            clients[id_] = ClientProject(name=name, timewax_code=code, wid=wid, toggl_id=id_)
+
+        projects = {}
+        for id_, wid, cid, code, name in self.connection.execute(
+                u'SELECT id, wid, cid, timewax_code, timewax_name FROM projects '
+                u'WHERE timewax_code IS NOT NULL AND wid IN (%s)' % placeholders, wids):
+            projects.setdefault(cid, {})[id_] = ProjectBreakdown(
+                name=name, timewax_code=code, wid=wid, toggl_id=id_, toggl_client_id=cid)
+
+        return clients, projects
+
+    def find_projects(self, pids):
+        """
+        Read the projects with the given identifiers, and their clients, where
+        both have Timewax codes. Projects that are not in the mirror are left out.
+
+        :param pids: Toggl project identifiers.
+        :return tuple: (clients, projects, unresolvable). Clients and projects are
+            dictionaries as load() returns them, unresolvable is a set of identifiers
+            of projects in the mirror that are not Timewax projects.
+        """
+        pids = list(pids)
+        clients = {}
+        projects = {}
+        unresolvable = set()
+
+        # SQLite limits the number of parameters of a query.
+        for i in range(0, len(pids), 500):
+            chunk = pids[i:i + 500]
+            with self._lock:
+                rows = self.connection.execute(
+                    u'SELECT p.id, p.wid, p.cid, p.timewax_code, p.timewax_name, '
+                    u'c.id, c.wid, c.timewax_code, c.timewax_name '
+                    u'FROM projects p LEFT JOIN clients c ON c.id = p.cid '
+                    u'WHERE p.id IN (%s)' % u', '.join(u'?' * len(chunk)), chunk).fetchall()
+
+            for id_, wid, cid, code, name, client_id, client_wid, client_code, client_name in rows:
+                if code is None or cid is None or (client_id is not None and client_code is None):
+                    unresolvable.add(id_)
+                    continue
+                if client_id is None:
+                    # The client is not in the mirror yet, the project is requested.
+                    continue
+
+                clients[cid] = ClientProject(name=client_name, timewax_code=client_code,
+                                             wid=client_wid, toggl_id=cid)
+                projects.setdefault(cid, {})[id_] = ProjectBreakdown(
+                    name=name, timewax_code=code, wid=wid, toggl_id=id_, toggl_client_id=cid)
+
+        return clients, projects, unresolvable
+
+    def close(self):
+        self.connection.close()
@@ -10,13 +10,28 @@ Author: Jochem Bijlard
 from __future__ import absolute_import, division, print_function
 
 from toggl_timewax import __version__
+from toggl_timewax.backfill import ReportsBackfill
+from toggl_timewax.cache import ResponseCache
+from toggl_timewax.catalog import CatalogMirror
+from toggl_timewax.logs import LOG_FORMAT, LogSession
+from toggl_timewax.outbox import Outbox
 from toggl_timewax.main import Toggl, Timewax
-
+from toggl_timewax.planner import CreationPlanner
+from toggl_timewax.pipeline import UploadPipeline
+from toggl_timewax.profiling import CommandProfiler, PROFILERS
+from toggl_timewax.reconcile import Reconciler
+from toggl_timewax.report import HoursReport, PERIODS, TOGGL, TIMEWAX
+from toggl_timewax.transport import Deadline, LimitExceeded, RequestBudget, Transport
+
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import itertools
 import logging
 import os
 import json
 from getpass import getpass
 import base64
+import hashlib
 
 import arrow
 import appdirs
@@ -27,11 +42,12 @@ import bcrypt
 
 APP_NAME = u'toggl-timewax'
 CONFIG_FILE = os.path.join(appdirs.user_config_dir(APP_NAME), 'config.json')
+CACHE_DIR = appdirs.user_cache_dir(APP_NAME)
+DATA_DIR = appdirs.user_data_dir(APP_NAME)
 N_DAYS_DEFAULT = 9
 
 logger = logging.getLogger(APP_NAME)
-logging.basicConfig(level=logging.INFO,
-                    format=u'%(asctime)s:%(name)s:%(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 
 
 # Python 2/3 compatibility
@@ -49,59 +65,181 @@ def sync_to_toggl(toggl, timewax):
     subsequently used to send time entries in Toggl back to Timewax.
     This eliminates the need to ever go into Timewax to fill in hours.
 
+    Missing clients and projects are first collected, then created
+    concurrently; clients before the projects that depend on them.
+
     :param toggl: Toggl object.
     :param timewax: Timewax object.
+    :return list: (kind, name) tuples for clients and projects that could not be created.
     """
     logger.info(u'Now adding clients and projects to Toggl.')
+    planner = CreationPlanner(toggl)
+
+    try:
+        for client_project, project_breakdown in timewax.list_my_projects():
+
+            toggl_client_id = toggl.get_client_id(client_project.toggl_name)
 
-    for client_project, project_breakdown in timewax.list_my_projects():
+            if toggl_client_id is None or \
+                    not toggl.client_has_project(project_breakdown.toggl_name, toggl_client_id):
 
-        if not toggl.has_client(client_project.toggl_name):
-            toggl.add_client(client_project.toggl_name)
+                if timewax.check_breakdown_authorization(client_project, project_breakdown):
+                    planner.add(client_project, project_breakdown)
 
-        toggl_client_id = toggl.get_client_id(client_project.toggl_name)
+    except LimitExceeded:
+        logger.error(u'Stopped while listing Timewax projects. ' +
+                     u'%s projects were planned, none have been created.', len(planner))
+        raise
 
-        if not toggl.client_has_project(project_breakdown.toggl_name, toggl_client_id):
+    failures = planner.execute()
+    planner.report()
 
-            if timewax.check_breakdown_authorization(client_project, project_breakdown):
-                toggl.add_project(toggl_client_id, project_breakdown.toggl_name)
+    if planner.cancelled:
+        raise planner.limit_error
 
     logger.info(u'Finished synchronizing projects from Timewax to Toggl.')
+    return failures
+
+
+def log_plan(plan):
+    """
+    Log what reconciliation found, one line per category.
 
+    :param plan: DiffPlan object.
+    """
+    if plan.running:
+        logger.info(u"Skipping %s entries: no stop date. They're probably running right now.",
+                    len(plan.running))
+    if plan.grown:
+        logger.info(u'Found %s entries that have changed. Adding additional entries to compensate.',
+                    len(plan.grown))
+    if plan.shrunk:
+        logger.warning(u'Found %s entries that are shorter in Toggl than in Timewax. ' +
+                       u'These have to be corrected in Timewax manually.', len(plan.shrunk))
+    logger.info(u'Skipping %s previous entries.', len(plan.unchanged))
+
+
+def fetch_recent_entries(toggl, timewax, n_days=9, backfill=None):
+    """
+    Download recent Timewax entries in the background while Toggl entries
+    start streaming in. Toggl entries that arrive before Timewax is done are
+    buffered, as they can only be compared once all Timewax entries are known.
 
-def sync_to_timewax(toggl, timewax, n_days=9):
+    :param toggl: Toggl object.
+    :param timewax: Timewax object.
+    :param n_days: days in the past to get entries for.
+    :param backfill: optional ReportsBackfill to get entries for its period instead.
+    :return: tuple with Timewax entries dictionary and an iterator of Toggl TimeEntry objects.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        if backfill is not None:
+            timewax_future = executor.submit(timewax.get_entries, *backfill.timewax_range)
+            toggl_entries = backfill.iter_entries()
+        else:
+            timewax_future = executor.submit(timewax.get_recent_entries, n_days)
+            toggl_entries = toggl.get_recent_entries(n_days)
+
+        buffered = []
+        for toggl_entry in toggl_entries:
+            buffered.append(toggl_entry)
+            if timewax_future.done():
+                break
+
+        recent_timewax = timewax_future.result()
+
+    return recent_timewax, itertools.chain(buffered, toggl_entries)
+
+
+def sync_to_timewax(toggl, timewax, n_days=9, pipelined=False, outbox=None, backfill=None):
     """
     Send over time entries made in Toggl to Timewax. This only works for entries made
     on projects imported from Timewax first.
 
+    In pipelined mode entries are sent in batches by a background worker while
+    Toggl entries are still coming in, instead of in one go at the end.
+
+    With an outbox, entries are recorded before they are sent, and uploads
+    interrupted in an earlier run are finished first.
+
     :param toggl: Toggl object.
     :param timewax: Timewax object.
     :param n_days: days in the past to sync entries.
+    :param pipelined: upload while downloading.
+    :param outbox: optional Outbox object.
+    :param backfill: optional ReportsBackfill, to sync its period instead of the last n_days.
     """
+    # This has to happen before recent Timewax entries are fetched,
+    # otherwise resumed entries would be sent twice.
+    if outbox is not None:
+        outbox.resume(timewax)
 
-    recent_timewax = timewax.get_recent_entries(n_days)
-    entries_to_update = []
+    recent_timewax, toggl_entries = fetch_recent_entries(toggl, timewax, n_days, backfill)
+    reconciler = Reconciler(recent_timewax)
+    uploads = reconciler.iter_uploads(toggl_entries)
 
-    for toggl_entry in toggl.get_recent_entries(n_days):
-        if not toggl_entry.stop:
-            logger.info(u"Skipping entry: no stop date. It's probably running right now.")
+    if outbox is not None:
+        send = functools.partial(outbox.send, timewax, known=recent_timewax)
+    else:
+        send = timewax.add_entries
 
-        elif toggl_entry.guid not in recent_timewax:
-            entries_to_update.append(toggl_entry)
+    if pipelined:
+        pipeline = UploadPipeline(send)
+        try:
+            with pipeline:
+                for entry in uploads:
+                    pipeline.put(entry)
+        finally:
+            logger.info(u'Sent %s entries to Timewax in %s batches.', pipeline.sent, pipeline.batches)
+            if pipeline.failed:
+                logger.error(u'Failed to add %s entries in Timewax.', len(pipeline.failed))
+
+        # Batches that failed because the deadline passed or the budget ran
+        # out are not reported as an exception.
+        timewax.transport.check()
 
-        # check if different between Timewax entry and Toggl entry is greater than +60 seconds
-        elif toggl_entry.duration - recent_timewax[toggl_entry.guid].duration > 60:
-            logger.info(u'Entry found that has changed. Adding additional entry to compensate.')
-            toggl_entry.duration -= recent_timewax[toggl_entry.guid].duration
-            entries_to_update.append(toggl_entry)
+    else:
+        entries_to_update = list(uploads)
+        if entries_to_update:
+            send(entries_to_update)
 
-        else:
-            logger.info(u'Skipping previous entry: %r' % toggl_entry)
+    log_plan(reconciler.finish())
+    logger.info(u'Finished synchronizing time entries from Toggl to Timewax.')
 
-    if entries_to_update:
-        timewax.add_entries(entries_to_update)
 
-    logger.info(u'Finished synchronizing time entries from Toggl to Timewax.')
+def get_outbox_from_ctx(ctx, timewax):
+    """
+    Outbox for the Timewax user, unless disabled with --no-outbox.
+
+    :param ctx: click.Context object.
+    :param timewax: Timewax object.
+    :return: Outbox object or None.
+    """
+    if ctx.params['no_outbox']:
+        return None
+
+    # Client and user names can contain characters that are not allowed in file names.
+    user = u'%s/%s' % (timewax.client, timewax.timewax_id)
+    account = hashlib.sha1(user.encode('utf-8')).hexdigest()[:12]
+    outbox = Outbox(os.path.join(DATA_DIR, 'outbox-%s.sqlite' % account))
+    ctx.call_on_close(outbox.close)
+    return outbox
+
+
+def get_timeouts(config, connect_timeout=None, read_timeout=None):
+    """
+    Timeouts per endpoint from the config. The default timeouts from the
+    config are only replaced by the ones given on the command line.
+
+    :param dict config: applied config.
+    :param connect_timeout: --connect-timeout, or None if not given.
+    :param read_timeout: --read-timeout, or None if not given.
+    :return dict: endpoint names as keys and (connect, read) tuples as values.
+    """
+    timeouts = {endpoint: tuple(t) for endpoint, t in config.get('timeouts', {}).items()}
+    connect, read = timeouts.get('default') or Transport.DEFAULT_TIMEOUT
+    timeouts['default'] = (connect if connect_timeout is None else connect_timeout,
+                           read if read_timeout is None else read_timeout)
+    return timeouts
 
 
 def get_toggl_timewax_from_ctx(ctx):
@@ -114,7 +252,7 @@ def get_toggl_timewax_from_ctx(ctx):
     """
     if not ctx.params['no_config'] and os.path.exists(CONFIG_FILE):
         config = read_config()
-        logger.info('Using configuration created at: %s' % config.get('creation_date'))
+        logger.info('Using configuration created at: %s', config.get('creation_date'))
 
     else:
         logger.info('Not using a configuration file. Continuing.')
@@ -129,15 +267,76 @@ def get_toggl_timewax_from_ctx(ctx):
     if ctx.params['n_days'] == N_DAYS_DEFAULT:
         ctx.params['n_days'] = config.get('n_days', N_DAYS_DEFAULT)
 
+    ctx.params['cache_dir'] = ctx.params['cache_dir'] or config.get('cache_dir') or CACHE_DIR
+
+    timeouts = get_timeouts(config, ctx.params['connect_timeout'], ctx.params['read_timeout'])
+    ctx.params['deadline'] = ctx.params['deadline'] or config.get('deadline')
+
+    if ctx.params['max_requests'] is None:
+        ctx.params['max_requests'] = config.get('max_requests')
+    endpoint_budgets = dict(config.get('max_endpoint_requests', {}))
+    endpoint_budgets.update(ctx.params['max_endpoint_requests'])
+
+    cache = None
+    if not ctx.params['no_cache']:
+        cache = ResponseCache(ctx.params['cache_dir'], ttl=ctx.params['cache_ttl'])
+        ctx.call_on_close(cache.close)
+
+    # Ask for missing credentials first, both services are connected to at the same time.
+    ctx.params['timewax_username'] = ctx.params['timewax_username'] or input('Timewax username: ')
+    ctx.params['timewax_password'] = ctx.params['timewax_password'] or getpass('Timewax password: ')
+    ctx.params['timewax_client'] = ctx.params['timewax_client'] or input('Timewax client: ')
+    ctx.params['toggl_key'] = ctx.params['toggl_key'] or getpass('Toggl api key: ')
+
+    catalog = None
+    if not ctx.params['no_catalog_mirror']:
+        # One mirror per Toggl account, as private projects differ per user.
+        account = hashlib.sha1(ctx.params['toggl_key'].encode('utf-8')).hexdigest()[:12]
+        catalog = CatalogMirror(os.path.join(ctx.params['cache_dir'], 'catalog-%s.sqlite' % account))
+        ctx.call_on_close(catalog.close)
+
+    # Both services share one transport, so the deadline and budget cover the whole command.
+    transport = Transport(timeouts, Deadline(ctx.params['deadline']),
+                          budget=RequestBudget(ctx.params['max_requests'], endpoint_budgets))
+    transport.command = ctx.info_name
+    ctx.ensure_object(dict)['transport'] = transport
+    ctx.call_on_close(lambda: logger.debug(u'\n'.join(transport.report())))
+
     logger.info('Connecting to Toggl and Timewax.')
-    timewax = Timewax(ctx.params['timewax_username'],
-                      ctx.params['timewax_password'],
-                      ctx.params['timewax_client'])
-    toggl = Toggl(ctx.params['toggl_key'], ctx.params['workspace_name'])
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        timewax_future = executor.submit(Timewax,
+                                         ctx.params['timewax_username'],
+                                         ctx.params['timewax_password'],
+                                         ctx.params['timewax_client'],
+                                         cache=cache,
+                                         transport=transport)
+        toggl_future = executor.submit(Toggl,
+                                       ctx.params['toggl_key'],
+                                       ctx.params['workspace_name'],
+                                       transport=transport,
+                                       catalog=catalog,
+                                       on_demand=ctx.params.get('on_demand', False))
+
+        timewax = timewax_future.result()
+        toggl = toggl_future.result()
 
     return ctx, toggl, timewax
 
 
+def parse_endpoint_budgets(ctx, param, value):
+    """
+    :return dict: endpoint names as keys and number of requests as values.
+    """
+    budgets = {}
+    for budget in value:
+        endpoint, _, count = budget.partition('=')
+        try:
+            budgets[endpoint.strip()] = int(count)
+        except ValueError:
+            raise click.BadParameter(u'Use ENDPOINT=N, e.g. toggl.add_project=50, not: %s' % budget)
+    return budgets
+
+
 _global_test_options = [
     click.option('-u', '--timewax-username', type=str,
                  help='Your timewax username. Usually this is first letter ' +
@@ -150,13 +349,40 @@ _global_test_options = [
                  help='Your toggl api key.'),
     click.option('-w', '--workspace-name', type=str,
                  help='A name to match your available workspaces against. ' +
-                      'The first one encountered will be picked. ' +
+                      'Separate names with commas to use several workspaces. ' +
                       'Not necessary if you have only one workspace.'),
     click.option('-n', '--n-days', type=int, default=N_DAYS_DEFAULT,
                  help='Number of days in the past to look for time entries to send ' +
                       'from Toggl to Timewax (default: 9)'),
     click.option('--no-config', 'no_config', is_flag=True,
                  help='Do not read config, even if it is available.'),
+    click.option('--cache-dir', type=click.Path(file_okay=False),
+                 help='Directory to cache Timewax project and breakdown listings in. ' +
+                      'Can be shared by several users (default: user cache directory).'),
+    click.option('--cache-ttl', type=int, default=ResponseCache.DEFAULT_TTL,
+                 help='Seconds cached Timewax listings stay valid ' +
+                      '(default: %s).' % ResponseCache.DEFAULT_TTL),
+    click.option('--no-cache', 'no_cache', is_flag=True,
+                 help='Do not use cached Timewax listings.'),
+    click.option('--no-catalog-mirror', 'no_catalog_mirror', is_flag=True,
+                 help='Download all Toggl clients and projects instead of updating ' +
+                      'the local copy in the cache directory.'),
+    click.option('--connect-timeout', type=float,
+                 help='Seconds to wait for a connection to Toggl or Timewax ' +
+                      '(default: %s).' % Transport.DEFAULT_TIMEOUT[0]),
+    click.option('--read-timeout', type=float,
+                 help='Seconds to wait for Toggl or Timewax to send data ' +
+                      '(default: %s).' % Transport.DEFAULT_TIMEOUT[1]),
+    click.option('--deadline', type=float,
+                 help='Seconds the whole command may take. Remaining work is cancelled ' +
+                      'when the deadline passes.'),
+    click.option('--max-requests', type=int,
+                 help='Number of requests to Toggl and Timewax the whole command may make. ' +
+                      'Remaining work is cancelled when they are used up.'),
+    click.option('--max-endpoint-requests', multiple=True, callback=parse_endpoint_budgets,
+                 metavar='ENDPOINT=N',
+                 help='Number of requests the command may make to one endpoint, ' +
+                      'e.g. toggl.add_project=50. Can be given more than once.'),
     click.version_option(version='toggl-timewax synchroniser version %s.' % __version__)
 ]
 
@@ -167,8 +393,48 @@ def shared_options(func):
     return func
 
 
+_upload_options = [
+    click.option('--pipelined', is_flag=True,
+                 help='Send entries to Timewax in batches while Toggl entries are still being downloaded.'),
+    click.option('--no-outbox', 'no_outbox', is_flag=True,
+                 help='Do not record uploads locally before sending them to Timewax.'),
+]
+
+
+def upload_options(func):
+    for option in reversed(_upload_options):
+        func = option(func)
+    return func
+
+
+def stop_on_limit(func):
+    """
+    Exit with status 2 instead of a traceback when a command runs out of time
+    or requests. The requests made so far are reported.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except LimitExceeded as e:
+            logger.error(u'%s Remaining work was cancelled.', e)
+            transport = click.get_current_context().find_object(dict).get('transport')
+            if transport is not None:
+                logger.error(u'\n'.join(transport.report()))
+            raise SystemExit(2)
+    return wrapper
+
+
 @click.group()
 @shared_options
+@click.option('--profile', type=click.Path(dir_okay=False),
+              help='Profile the command and write the profile to this file, ' +
+                   'with a summary next to it (.txt).')
+@click.option('--profiler', type=click.Choice(PROFILERS), default='sampling',
+              help='sampling: all threads. cprofile: exact, main thread only (default: sampling).')
+@click.option('-v', '--verbose', is_flag=True,
+              help='Show debug messages, including one line per time entry, client or ' +
+                   'project. Otherwise these are summarised at the end.')
 @click.pass_context
 def cli(ctx, **kwargs):
     """
@@ -191,24 +457,74 @@ def cli(ctx, **kwargs):
     by running the following:
 
         $ toggl-timewax to_timewax
+
+    Or do both at once:
+
+        $ toggl-timewax sync
     """
+    ctx.ensure_object(dict)
+
+    # Registered first, so it is closed last and also writes what is logged on close.
+    log_session = LogSession(ctx.params['verbose'])
+    ctx.call_on_close(log_session.close)
+
+    if ctx.params['profile']:
+        profiler = CommandProfiler(ctx.params['profile'], ctx.params['profiler'])
+        profiler.start()
+
+        def stop_profiler():
+            click.echo(profiler.stop(ctx.obj.get('transport')), err=True)
+
+        ctx.call_on_close(stop_profiler)
 
 
 @cli.command(short_help='Add time entries to Timewax.')
 @shared_options
+@upload_options
+@click.option('--on-demand', 'on_demand', is_flag=True,
+              help='Only get the Toggl projects used by recent entries, ' +
+                   'instead of all clients and projects.')
 @click.pass_context
+@stop_on_limit
 def to_timewax(ctx, **kwargs):
     """
     Send over time entries made in Toggl to Timewax. This only works for entries made
     on projects imported from Timewax first.
     """
     ctx, toggl, timewax = get_toggl_timewax_from_ctx(ctx)
-    sync_to_timewax(toggl, timewax, ctx.params['n_days'])
+    sync_to_timewax(toggl, timewax, ctx.params['n_days'],
+                    pipelined=ctx.params['pipelined'], outbox=get_outbox_from_ctx(ctx, timewax))
+
+
+@cli.command(short_help='Add older time entries to Timewax.')
+@shared_options
+@click.option('--since', required=True,
+              help='First day (YYYY-MM-DD) to send Toggl entries for.')
+@click.option('--until',
+              help='Last day (YYYY-MM-DD) to send Toggl entries for (default: today).')
+@upload_options
+@click.pass_context
+@stop_on_limit
+def backfill(ctx, **kwargs):
+    """
+    Like to_timewax, but for any period in the past. Entries are found with the
+    Toggl detailed reports API, which is not limited to recent entries.
+    """
+    ctx, toggl, timewax = get_toggl_timewax_from_ctx(ctx)
+    reports = ReportsBackfill(toggl, ctx.params['since'], ctx.params['until'])
+    sync_to_timewax(toggl, timewax, pipelined=ctx.params['pipelined'],
+                    outbox=get_outbox_from_ctx(ctx, timewax), backfill=reports)
+
+    if reports.unmatched:
+        logger.error(u'%s Toggl report entries could not be matched to time entries ' +
+                     u'and were not sent to Timewax.', len(reports.unmatched))
+        raise SystemExit(1)
 
 
 @cli.command(short_help='Add projects to Toggl.')
 @shared_options
 @click.pass_context
+@stop_on_limit
 def to_toggl(ctx, **kwargs):
     """
     For every project and breakdown available to your user in Timewax,
@@ -216,10 +532,106 @@ def to_toggl(ctx, **kwargs):
     both the code and name of Timewax entities. The naming convention is
     subsequently used to send time entries in Toggl back to Timewax.
     This eliminates the need to ever go into Timewax to fill in hours.
+
+    Timewax project and breakdown listings are cached for 4 hours by default
+    (see --cache-ttl), so new breakdowns can take that long to show up in
+    Toggl. Use --no-cache or 'cache clear' to pick them up right away.
+    """
+    ctx, toggl, timewax = get_toggl_timewax_from_ctx(ctx)
+    sync_to_toggl(toggl, timewax)
+
+
+@cli.command(short_help='Add projects to Toggl, then time entries to Timewax.')
+@shared_options
+@upload_options
+@click.pass_context
+@stop_on_limit
+def sync(ctx, **kwargs):
+    """
+    Run to_toggl and to_timewax in one go, with a single login to Timewax and
+    Toggl. Projects added to Toggl in the first step are known to the second
+    step without downloading them again.
     """
     ctx, toggl, timewax = get_toggl_timewax_from_ctx(ctx)
+
+    # Requests are counted per step.
+    toggl.transport.command = 'to_toggl'
     sync_to_toggl(toggl, timewax)
 
+    toggl.transport.command = 'to_timewax'
+    sync_to_timewax(toggl, timewax, ctx.params['n_days'],
+                    pipelined=ctx.params['pipelined'], outbox=get_outbox_from_ctx(ctx, timewax))
+
+
+@cli.command(short_help='Report hours per project and breakdown.')
+@shared_options
+@click.option('--period', type=click.Choice(PERIODS), default='day',
+              help='Group hours per day or per week (default: day).')
+@click.option('--discrepancies', is_flag=True,
+              help='Only show rows where Toggl and Timewax differ.')
+@click.pass_context
+@stop_on_limit
+def report(ctx, **kwargs):
+    """
+    Show hours per Timewax project, breakdown and day or week as found in
+    Toggl and in Timewax, and the difference between the two. Timewax hours
+    that were not sent from Toggl are shown under the 'untracked' breakdown.
+    """
+    ctx, toggl, timewax = get_toggl_timewax_from_ctx(ctx)
+    n_days = ctx.params['n_days']
+
+    # Both sources are clipped to the same whole days.
+    today = arrow.now().floor('day')
+    since = today.shift(days=-n_days)
+    hours_report = HoursReport(ctx.params['period'], since=since.format('YYYY-MM-DD'),
+                               until=today.format('YYYY-MM-DD'))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        timewax_future = executor.submit(timewax.list_entries, since.format(Timewax.DATE_FORMAT),
+                                         today.format(Timewax.DATE_FORMAT))
+        # Toggl looks back from now, a day more covers the first day entirely.
+        hours_report.add_entries(toggl.get_recent_entries(n_days + 1), TOGGL)
+        hours_report.add_entries(timewax_future.result(), TIMEWAX)
+
+    click.echo(hours_report.format(ctx.params['discrepancies']))
+
+
+@cli.group(name='cache', short_help='Inspect or clear cached Timewax listings.')
+def cache_group():
+    """
+    Timewax project and breakdown listings are cached on disk. Use these
+    commands to see cache statistics or to remove cached listings, for instance
+    after a project has been added in Timewax.
+    """
+
+
+_cache_dir_option = click.option('--cache-dir', type=click.Path(file_okay=False), default=CACHE_DIR,
+                                 help='Cache directory (default: %s).' % CACHE_DIR)
+
+
+@cache_group.command(name='info', short_help='Show cache statistics.')
+@_cache_dir_option
+def cache_info(cache_dir):
+    """
+    Show number of cached listings, their size and hit/miss statistics.
+    """
+    info = ResponseCache(cache_dir).info()
+    for key in ('directory', 'entries', 'bytes', 'hits', 'misses'):
+        click.echo(u'%-10s %s' % (key + ':', info.get(key)))
+
+
+@cache_group.command(name='clear', short_help='Remove cached listings.')
+@_cache_dir_option
+@click.option('-c', '--timewax-client', type=str,
+              help='Only remove listings of this Timewax client.')
+def cache_clear(cache_dir, timewax_client):
+    """
+    Remove cached listings, either all of them or those of one Timewax client.
+    """
+    prefix = u'timewax/%s/' % timewax_client if timewax_client else u''
+    removed = ResponseCache(cache_dir).invalidate(prefix)
+    logger.info(u'Removed %s cached listings.', removed)
+
 
 @cli.command(short_help='Store secrets once.')
 def generate_config(**kwargs):
@@ -232,7 +644,7 @@ def generate_config(**kwargs):
         'creation_date': arrow.now().format('YYYY-MM-DD HH:mm:ss'),
         'timewax_username': input('Timewax User identifier: '),
         'timewax_client': input('Timewax client: '),
-        'workspace_name': input('Toggl workspace name to match, leave empty ' +
+        'workspace_name': input('Toggl workspace names to match (comma separated), leave empty ' +
                                 'to pick the first one encountered: '),
     }
 
@@ -271,7 +683,7 @@ def generate_config(**kwargs):
     os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
     with open(CONFIG_FILE, 'w') as f:
         json.dump(data, f)
-        logger.info('Writing config to %s' % CONFIG_FILE)
+        logger.info('Writing config to %s', CONFIG_FILE)
 
     logger.info('Finished.')
 
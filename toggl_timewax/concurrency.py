@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Worker defaults and rate limiting for concurrent requests. """
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+import time
+
+DEFAULT_WORKERS = 4
+
+
+class RateLimiter(object):
+    """
+    Thread safe limiter that spaces out calls so no more than
+    calls_per_second are started in any one second.
+    """
+
+    def __init__(self, calls_per_second=4):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """
+        Block until the caller is allowed to make its next call.
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+    def __enter__(self):
+        self.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
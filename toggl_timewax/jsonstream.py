@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Incremental decoding of JSON array responses. """
+
+from __future__ import absolute_import, division, print_function
+
+import codecs
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CHUNK_SIZE = 16 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+_NUMBER_START = '-0123456789'
+
+
+def iter_json_array(response, chunk_size=CHUNK_SIZE):
+    """
+    Yield the elements of a top level JSON array from a streamed requests
+    response (stream=True) one at a time, while the body is still being
+    downloaded. Uses ijson when it is installed, otherwise the standard
+    library decoder.
+
+    :param response: requests.Response object.
+    :param int chunk_size: number of bytes to read at a time.
+    :return: generator of decoded elements.
+    """
+    if ijson is not None:
+        response.raw.decode_content = True
+        return ijson.items(response.raw, 'item', use_float=True)
+
+    return iter_json_chunks(response.iter_content(chunk_size=chunk_size),
+                            response.encoding or 'utf-8')
+
+
+def iter_json_chunks(chunks, encoding='utf-8'):
+    """
+    Yield the elements of a top level JSON array from an iterable of bytes chunks.
+
+    :param chunks: iterable of bytes.
+    :param str encoding: encoding of the bytes.
+    :return: generator of decoded elements.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    chunks = iter(chunks)
+
+    buffer = u''
+    position = 0
+    exhausted = False
+    # What has to come next: the opening '[', an element or ']' right after it,
+    # an element after a comma, or a comma or ']' after an element.
+    expected = 'array'
+
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+
+        if position < len(buffer) and expected == 'array':
+            head = buffer[position:position + 4]
+
+            if buffer[position] == '[':
+                expected = 'first'
+                position += 1
+                continue
+
+            # Toggl answers with null rather than an empty array for some endpoints.
+            elif head == 'null':
+                return
+
+            elif exhausted or not 'null'.startswith(head):
+                raise ValueError(u'Expected a JSON array, found: %r' % buffer[position:position + 20])
+
+        elif position < len(buffer) and expected == 'separator':
+            if buffer[position] == ']':
+                return
+            if buffer[position] != ',':
+                raise ValueError(u"Expected ',' or ']', found: %r" % buffer[position:position + 20])
+            expected = 'element'
+            position += 1
+            continue
+
+        elif position < len(buffer):
+            if buffer[position] == ']' and expected == 'first':
+                return
+            if buffer[position] in ',]':
+                raise ValueError(u'Expected an array element, found: %r' % buffer[position:position + 20])
+
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if exhausted:
+                    raise
+            else:
+                # A number can continue in the next chunk ('1.' followed by '5'), so it
+                # is only complete once a delimiter follows. Other values end in a
+                # character of their own.
+                if exhausted or buffer[position] not in _NUMBER_START or \
+                        (end < len(buffer) and buffer[end] in _DELIMITERS):
+                    position = end
+                    expected = 'separator'
+                    yield element
+                    continue
+
+        elif exhausted:
+            raise ValueError(u'Unexpected end of JSON array.')
+
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            chunk = text_decoder.decode(b'', final=True)
+        else:
+            chunk = text_decoder.decode(chunk)
+
+        buffer = buffer[position:] + chunk
+        position = 0
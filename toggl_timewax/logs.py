@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Logging setup for commands: background writing and per entry summaries. """
+
+from __future__ import absolute_import, division, print_function
+
+from collections import Counter
+import logging
+import threading
+
+# Python 2/3 compatibility
+try:
+    from logging.handlers import QueueHandler, QueueListener
+    import queue
+except ImportError:
+    QueueHandler = QueueListener = None
+
+LOGGER_NAME = 'toggl-timewax'
+LOG_FORMAT = u'%(asctime)s:%(name)s:%(levelname)s - %(message)s'
+
+# Descriptions of the per entry categories, used in the summary.
+CATEGORIES = (
+    ('to be added', u'entries to be added to Timewax'),
+    ('entry mismatch', u'Toggl entries skipped, project not found'),
+    ('no guid', u'Timewax entries without a Toggl GUID, do not add these manually'),
+    ('non timewax client', u'Toggl clients without Timewax code'),
+    ('non timewax project', u'Toggl projects without Timewax code'),
+    ('not authorised', u'Timewax breakdowns not authorised'),
+    ('added client', u'clients added to Toggl'),
+    ('added project', u'projects added to Toggl'),
+)
+
+
+class CategoryFilter(logging.Filter):
+    """
+    Counts log records that are about a single entry, recognised by a category
+    given with extra={'category': ...}. These are mostly logged at DEBUG, so
+    the toggl-timewax logger lets every record through and this filter applies
+    the log level instead.
+    """
+
+    def __init__(self, level=logging.INFO):
+        logging.Filter.__init__(self)
+        self.level = level
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        category = getattr(record, 'category', None)
+        if category is not None:
+            with self._lock:
+                self.counts[category] += 1
+        return record.levelno >= self.level
+
+    def summary(self):
+        """
+        :return list: one line per category that was logged, in order of CATEGORIES.
+        """
+        descriptions = dict(CATEGORIES)
+        order = [name for name, _ in CATEGORIES]
+        known = sorted(self.counts, key=lambda c: order.index(c) if c in order else len(order))
+        return [u'%6s %s' % (self.counts[c], descriptions.get(c, c)) for c in known]
+
+
+class LogSession(object):
+    """
+    Logging for one command: records are handed over to a background thread that
+    writes them, so logging does not wait on the terminal. Without QueueHandler
+    (Python 2) records are written directly. Messages about single entries are
+    counted and summarised at the end; they are only written when verbose.
+    """
+
+    def __init__(self, verbose=False):
+        """
+        :param bool verbose: log at DEBUG level, which includes per entry messages.
+        """
+        level = logging.DEBUG if verbose else logging.INFO
+        self.filter = CategoryFilter(level)
+
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        if QueueHandler is not None:
+            records = queue.Queue(-1)
+            self.handler = QueueHandler(records)
+            self.listener = QueueListener(records, stream_handler)
+            self.listener.start()
+        else:
+            self.handler = stream_handler
+            self.listener = None
+
+        # Filtered records never reach the queue, so they are never formatted.
+        self.handler.addFilter(self.filter)
+
+        # Restored by close().
+        root = logging.getLogger()
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self._previous = (root.handlers[:], root.level, self.logger.level)
+
+        root.handlers = [self.handler]
+        root.setLevel(level)
+
+        # Per entry DEBUG records have to be created to be counted.
+        self.logger.setLevel(logging.DEBUG)
+
+    def close(self):
+        """ Log the summary, write all remaining records and restore the previous handlers and levels. """
+        if self.filter.counts:
+            self.logger.info(u'Summary:\n%s', u'\n'.join(self.filter.summary()))
+
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+        handlers, root_level, level = self._previous
+        root = logging.getLogger()
+        root.handlers = handlers
+        root.setLevel(root_level)
+        self.logger.setLevel(level)
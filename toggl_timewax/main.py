@@ -12,20 +12,29 @@ from __future__ import absolute_import, division, print_function
 from xml.etree import ElementTree
 from xml.sax.saxutils import escape
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass
 import logging
 import re
+import threading
 
 import arrow
-import requests
 from requests.auth import HTTPBasicAuth
 
+from toggl_timewax.concurrency import DEFAULT_WORKERS
+from toggl_timewax.jsonstream import iter_json_array
+from toggl_timewax.transport import Transport
+
 # Python 2/3 compatibility
 try:
     input = raw_input
 except NameError:
     pass
 
+# Time entries waiting for their projects in on demand mode, at most.
+ON_DEMAND_BATCH = 50
+
 logger = logging.getLogger('toggl-timewax')
 logging.basicConfig(level=logging.INFO,
                     format=u'%(asctime)s:%(name)s:%(levelname)s - %(message)s')
@@ -83,10 +92,12 @@ class ClientProject(object):
 
             return ClientProject(name=name,
                                  timewax_code=code,
+                                 wid=json_data.get('wid'),
                                  toggl_id=json_data.get('id'))
 
         except (ValueError, AttributeError):
-            logger.error(u'Non Timewax client, found: %s' % json_data.get('name'))
+            logger.debug(u'Non Timewax client, found: %s', json_data.get('name'),
+                         extra={'category': 'non timewax client'})
             raise EntryMismatchException
     
     @staticmethod
@@ -134,10 +145,12 @@ class ProjectBreakdown(object):
             code, name = json_data.get('name').split(' - ', 1)
             return ProjectBreakdown(name=name,
                                     timewax_code=code,
+                                    wid=json_data.get('wid'),
                                     toggl_client_id=json_data.get('cid'),
                                     toggl_id=json_data.get('id'))
         except ValueError:
-            logger.error(u'Skipping non Timewax project found: %s' % json_data.get('name'))
+            logger.debug(u'Skipping non Timewax project found: %s', json_data.get('name'),
+                         extra={'category': 'non timewax project'})
 
     @staticmethod
     def from_timewax(xml_data):
@@ -158,6 +171,9 @@ class TimeEntry(object):
     
     TIMEWAX_TIME_FORMAT = 'HH:mm'
 
+    __slots__ = ('guid', 'description', 'duration', 'pid', 'start', 'stop',
+                 'wid', 'resource', 'breakdown', 'project')
+
     def __init__(self, guid, description=None, duration=None, pid=None, 
                  start=None, stop=None, wid=None, resource=None, breakdown=None, project=None):
         """
@@ -211,8 +227,11 @@ class TimeEntry(object):
         return (self.description or '') + ' ID:%s' % self.guid
 
     def __repr__(self):
+        # Parse the start once, instead of once for date and once for start_time.
+        start = arrow.get(self.start)
         return u'TimeEntry(%s, %s, date=%s, start=%s, hours=%0.2f)' % \
-               (self.project, self.breakdown, self.date, self.start_time, self.hours)
+               (self.project, self.breakdown, start.format(fmt=Timewax.DATE_FORMAT),
+                start.format(fmt=self.TIMEWAX_TIME_FORMAT), self.hours)
     
     def to_xml(self):
         return u"""
@@ -230,25 +249,36 @@ class TimeEntry(object):
                self.start_time, self.end_time, escape(self.timewax_description))
 
     @staticmethod
-    def from_timewax(xml_data):
+    def from_timewax(xml_data, require_guid=True):
         """
         Create object from timewax xml response. If there is no GUID in description, this will 
-        raise EntryMismatchException.
+        raise EntryMismatchException, unless require_guid is False, then the GUID is None.
         """
         desc = xml_data.find('description').text
         project = xml_data.find('project').text
         duration = float(xml_data.find('hours').text) * 60 * 60
+        breakdown = xml_data.findtext('breakdown')
+
+        # Timewax dates (YYYYMMDD) are stored as ISO dates, like Toggl start dates.
+        start = xml_data.findtext('date')
+        if start and len(start) == 8 and start.isdigit():
+            start = u'%s-%s-%s' % (start[:4], start[4:6], start[6:])
 
         if desc and 'ID:' in desc:
             guid = desc.rsplit('ID:', 1)[-1]
+        elif not require_guid:
+            guid = None
         else:
-            logger.warning(u'Time entry has no GUID and does not originate from Toggl. \n' +
-                           u'Make sure to not add duplicate time entries manually!')
+            logger.debug(u'Time entry has no GUID and does not originate from Toggl. \n' +
+                         u'Make sure to not add duplicate time entries manually!',
+                         extra={'category': 'no guid'})
             raise EntryMismatchException
 
         return TimeEntry(guid=guid,
                          description=desc,
                          duration=duration,
+                         start=start,
+                         breakdown=breakdown,
                          project=project)
 
 
@@ -264,10 +294,19 @@ class Timewax(object):
     ENTRIES_LIST = u'https://api.timewax.com/time/entries/list/'
     ENTRIES_ADD = u'https://api.timewax.com/time/entries/add/'
 
-    def __init__(self, timewax_id=None, timewax_key=None, client=None):
+    def __init__(self, timewax_id=None, timewax_key=None, client=None, cache=None, transport=None):
+        """
+        :param timewax_id: Timewax username.
+        :param timewax_key: Timewax password.
+        :param client: Timewax client (company) name.
+        :param cache: optional ResponseCache for project and breakdown listings.
+        :param transport: Transport to make requests with.
+        """
         self.timewax_id = timewax_id or input('Timewax username: ')
         self.timewax_key = timewax_key or getpass('Timewax password: ')
         self.client = client or input('Timewax client: ')
+        self.cache = cache
+        self.transport = transport or Transport()
 
         self.token = self.get_token()
 
@@ -284,7 +323,7 @@ class Timewax(object):
                 <password>%s</password>
             </request>""" % (self.client, self.timewax_id, self.timewax_key)
 
-        r = requests.post(self.GET_TOKEN, data=login)
+        r = self.transport.post(self.GET_TOKEN, 'timewax.token', data=login)
         root = ElementTree.fromstring(r.text)
         try:
             token = root.find("token").text
@@ -303,6 +342,30 @@ class Timewax(object):
         """
         return "<request><token>%s</token>%s</request>" % (self.token, data)
 
+    def post_cached(self, url, endpoint, data, cache_key, section):
+        """
+        Post a request and parse the xml response. If a cache is available the
+        response is taken from there, and stored there if it contains section.
+
+        :param str url: Timewax end point.
+        :param str endpoint: endpoint name for the transport.
+        :param str data: xml request.
+        :param str cache_key: key for the response in the cache.
+        :param str section: xml element a valid response should contain.
+        :return: tuple with the response text and its ElementTree root.
+        """
+        text = self.cache.get(cache_key) if self.cache else None
+        from_cache = text is not None
+
+        if not from_cache:
+            text = self.transport.post(url, endpoint, data=data).text
+
+        root = ElementTree.fromstring(text)
+        if self.cache and not from_cache and root.find(section) is not None:
+            self.cache.set(cache_key, text)
+
+        return text, root
+
     def list_of_projects(self):
         """
         Yields project objects for projects visible to your user.
@@ -314,9 +377,10 @@ class Timewax(object):
                <isActive>Yes</isActive>
                <portfolio></portfolio>""")
 
-        r = requests.post(self.PROJECT_LIST, data=project_list)
+        # Visible projects differ per user, so the user is part of the key.
+        cache_key = self.make_cache_key('projects', self.timewax_id)
+        _, root = self.post_cached(self.PROJECT_LIST, 'timewax.projects', project_list, cache_key, 'projects')
 
-        root = ElementTree.fromstring(r.text)
         for project in root.find('projects'):
             yield ClientProject.from_timewax(project)
 
@@ -327,15 +391,22 @@ class Timewax(object):
         :param str project_code: Timewax project code
         """
         request = self.create_request("<project>%s</project>" % project_code)
-        r = requests.post(self.BREAKDOWN_LIST, data=request)
 
-        if self.timewax_id in r.text:
-            root = ElementTree.fromstring(r.text)
+        # Breakdowns are the same for every user of a client, so these are shared.
+        cache_key = self.make_cache_key('breakdowns', project_code)
+        text, root = self.post_cached(self.BREAKDOWN_LIST, 'timewax.breakdowns', request, cache_key, 'breakdowns')
+
+        # Only breakdowns of projects the user is a resource of are listed.
+        if self.timewax_id in text:
 
             for breakdown in root.find('breakdowns'):
                 if breakdown.find('name').text:
                     yield ProjectBreakdown.from_timewax(breakdown)
 
+    def make_cache_key(self, *parts):
+        """ Cache key for a Timewax resource of this client. """
+        return u'/'.join([u'timewax', self.client] + [u'%s' % p for p in parts])
+
     def list_my_projects(self):
         """
         Yields tuples for every available breakdown in Timewax.
@@ -358,20 +429,22 @@ class Timewax(object):
 
         n_days_ago = arrow.now().shift(days=-n_days).format(self.DATE_FORMAT)
         now = arrow.now().format(self.DATE_FORMAT)        
-        logger.info('Getting Timewax entries since: %s' % n_days_ago)
+        logger.info('Getting Timewax entries since: %s', n_days_ago)
 
-        package = self.create_request(
-            u"""<dateFrom>%s</dateFrom>
-               <dateTo>%s</dateTo>
-               <resource>%s</resource>
-            """ % (n_days_ago, now, self.timewax_id))
+        return self.get_entries(n_days_ago, now)
 
-        r = requests.post(self.ENTRIES_LIST, data=package)
-        root = ElementTree.fromstring(r.text)
-        
+    def get_entries(self, date_from, date_to):
+        """
+        Get your entries between two dates, inclusive. Entries with the same GUID
+        are combined into one entry with their total duration.
+
+        :param str date_from: date in Timewax format (YYYYMMDD).
+        :param str date_to: date in Timewax format (YYYYMMDD).
+        :return dict: GUIDs as keys and TimeEntry objects as values.
+        """
         entries = {}
 
-        for xml_entry in root.find('entries'):
+        for xml_entry in self.list_entries_xml(date_from, date_to):
             
             try:
                 time_entry = TimeEntry.from_timewax(xml_entry)
@@ -390,6 +463,30 @@ class Timewax(object):
                 })
         return entries
 
+    def list_entries(self, date_from, date_to):
+        """
+        Get all your entries between two dates, inclusive, one TimeEntry per
+        Timewax entry. Entries that were not sent from Toggl have no GUID.
+
+        :param str date_from: date in Timewax format (YYYYMMDD).
+        :param str date_to: date in Timewax format (YYYYMMDD).
+        :return list: TimeEntry objects.
+        """
+        return [TimeEntry.from_timewax(xml_entry, require_guid=False)
+                for xml_entry in self.list_entries_xml(date_from, date_to)]
+
+    def list_entries_xml(self, date_from, date_to):
+        """ Entry elements of the Timewax response for your entries between two dates. """
+        package = self.create_request(
+            u"""<dateFrom>%s</dateFrom>
+               <dateTo>%s</dateTo>
+               <resource>%s</resource>
+            """ % (date_from, date_to, self.timewax_id))
+
+        r = self.transport.post(self.ENTRIES_LIST, 'timewax.entries_list', data=package)
+        root = ElementTree.fromstring(r.text)
+        return root.find('entries')
+
     def check_breakdown_authorization(self, project, breakdown):
         """
         Check if your user is authorized to book hours on a project.
@@ -404,7 +501,11 @@ class Timewax(object):
         # will consider this a valid post request to the API but it will not return an identifier
         # for the time entry or write it to the database. In case the user is not authorised it
         # will return a non-valid.
+        # Dated today, arrow does not accept entries without a start.
+        now = arrow.now().isoformat()
         probe = TimeEntry(guid='not-quite-a-guid',
+                          start=now,
+                          stop=now,
                           resource=self.timewax_id,
                           duration=-60,
                           project=project.timewax_code,
@@ -413,13 +514,14 @@ class Timewax(object):
         package = self.create_request(
             u'<timelines>%s</timelines>' % probe.to_xml())
 
-        r = requests.post(self.ENTRIES_ADD, data=package)
+        r = self.transport.post(self.ENTRIES_ADD, 'timewax.authorization', data=package)
 
         root = ElementTree.fromstring(r.text)
         if root.find('valid').text == 'yes':
             return True
         else:
-            logger.info(u'Not authorised for %r - %r' % (project, breakdown))
+            logger.debug(u'Not authorised for %r - %r', project, breakdown,
+                         extra={'category': 'not authorised'})
             return False
 
     def add_entries(self, time_entries):
@@ -427,21 +529,24 @@ class Timewax(object):
         Add a list of TimeEntry objects to Timewax.
 
         :param time_entries: list of TimeEntry objects.
+        :return bool: whether Timewax accepted the entries.
         """
         for entry in time_entries:
             entry.resource = self.timewax_id
-            logger.info(u'To be added: %r' % entry)
+            logger.debug(u'To be added: %r', entry, extra={'category': 'to be added'})
         package = self.create_request(
             u'<timelines>%s</timelines>' % u''.join([e.to_xml() for e in time_entries]))
 
-        r = requests.post(self.ENTRIES_ADD, data=package)
+        r = self.transport.post(self.ENTRIES_ADD, 'timewax.entries_add', data=package)
         
         root = ElementTree.fromstring(r.text)
         if root.find('valid').text == 'yes':
-            logger.info(u'Successfully added %s entries.' % len(time_entries))
+            logger.info(u'Successfully added %s entries.', len(time_entries))
+            return True
         else:
             logger.error(u'Unable to add entries to Timewax.')
             logger.info(r.text)
+            return False
 
 
 class Toggl(object):
@@ -453,31 +558,127 @@ class Toggl(object):
     WORKSPACES = 'https://www.toggl.com/api/v8/workspaces'
     PROJECTS = 'https://www.toggl.com/api/v8/projects'
     TIME_ENTRIES = 'https://www.toggl.com/api/v8/time_entries'
+    ME = 'https://www.toggl.com/api/v8/me'
 
-    def __init__(self, api_key=None, workspace_name=None):
+    def __init__(self, api_key=None, workspace_name=None, transport=None, catalog=None,
+                 on_demand=False):
+        """
+        :param api_key: Toggl API token.
+        :param workspace_name: text to match workspace names against. Can be a list
+            or a comma separated string to use more than one workspace.
+        :param transport: Transport to make requests with.
+        :param catalog: optional CatalogMirror to load clients and projects from.
+        :param on_demand: do not load all clients and projects, only get the projects
+            of time entries when they are needed. Not suitable for creating projects.
+            A catalog mirror is then only updated with changes, never downloaded in full.
+        """
         self.toggl_key = api_key or getpass('Toggl api key: ')
         self.auth = HTTPBasicAuth(self.toggl_key, 'api_token')
-        self.wid = self.get_workspace(workspace_name)
-        self.clients = self.get_all_clients()
-        self.projects = self.get_all_projects()
+        self.transport = transport or Transport()
+        self.catalog = catalog
+        # Guards self.clients and self.projects when clients and projects are added concurrently.
+        self._lock = threading.Lock()
 
-    def get_workspace(self, workspace_name=None):
-        """ 
-        Get the workspace identifier (wid). This tooling only supports
-        a single workspace. Will pick the first workspace found.
+        self.workspaces = self.get_workspaces(workspace_name)
+        # New clients are created in the first workspace.
+        self.wid = next(iter(self.workspaces))
+
+        self.clients = {}
+        self.projects = {}
+        # Project identifier -> client identifier, to look up projects without a scan.
+        self._project_index = {}
 
-        :param str workspace_name: text to match workspace name.
-        :return int: workspace identifier.
+        self.on_demand = on_demand
+        # Projects requested on demand that are not Timewax projects, or not accessible.
+        self._unresolvable = set()
+
+        if not on_demand:
+            self.load_catalog()
+        elif self.catalog is not None:
+            # Only changes, so renamed or moved projects are not resolved from an outdated mirror.
+            self.catalog.refresh(self, download=False)
+
+    def iter_json(self, url, endpoint, **kwargs):
         """
-        r = requests.get(self.WORKSPACES, auth=self.auth)
+        Stream a GET request that returns a JSON array and yield its
+        elements as soon as they are downloaded.
 
-        if workspace_name:
-            w = [w for w in r.json() if workspace_name in w.get('name')]
+        :param str url: Toggl API url.
+        :param str endpoint: endpoint name for the transport.
+        :return: generator of decoded JSON elements.
+        """
+        r = self.transport.get(url, endpoint, auth=self.auth, stream=True, **kwargs)
+        deadline = self.transport.deadline
+        try:
+            for element in iter_json_array(r):
+                # Read timeouts apply per read, a slowly trickling body is stopped here.
+                deadline.check()
+                yield element
+        finally:
+            r.close()
+
+    def get_workspaces(self, workspace_name=None):
+        """
+        Get the workspaces to use. Every workspace whose name contains one of the
+        given names is used. Without a name the first workspace found is picked.
+
+        :param workspace_name: text to match workspace names, a list of those or
+            a comma separated string.
+        :return OrderedDict: workspace identifiers as keys and names as values.
+        """
+        if not workspace_name:
+            names = []
+        elif isinstance(workspace_name, (list, tuple)):
+            names = list(workspace_name)
         else:
-            w = r.json()[0]
+            names = [n.strip() for n in workspace_name.split(',') if n.strip()]
+
+        r = self.transport.get(self.WORKSPACES, 'toggl.workspaces', auth=self.auth)
+        available = r.json() or []
 
-        logger.info(u'Using workspace named: %s' % w.get('name'))
-        return w.get('id')
+        if names:
+            matching = [w for w in available if any(n in w.get('name') for n in names)]
+        else:
+            matching = available[:1]
+
+        if not matching:
+            logger.error(u'No Toggl workspace found matching: %s', u', '.join(names))
+            raise SystemExit
+
+        workspaces = OrderedDict((w.get('id'), w.get('name')) for w in matching)
+        logger.info(u'Using workspaces named: %s', u', '.join(workspaces.values()))
+        return workspaces
+
+    def load_catalog(self):
+        """
+        Load clients and projects of all workspaces concurrently into
+        self.clients and self.projects. With a catalog mirror only changes
+        are downloaded, and the rest is read from the mirror.
+        """
+        if self.catalog is not None:
+            self.catalog.refresh(self)
+            self.clients, self.projects = self.catalog.load(self.workspaces)
+            self._index_projects()
+            return
+
+        n_workers = min(DEFAULT_WORKERS, 2 * len(self.workspaces))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            clients = [executor.submit(self.get_all_clients, wid) for wid in self.workspaces]
+            projects = [executor.submit(self.get_all_projects, wid) for wid in self.workspaces]
+
+            for future in clients:
+                self.clients.update(future.result())
+
+            for future in projects:
+                for client_id, client_projects in future.result().items():
+                    self.projects.setdefault(client_id, {}).update(client_projects)
+
+        self._index_projects()
+
+    def _index_projects(self):
+        self._project_index = {pid: client_id
+                               for client_id, client_projects in self.projects.items()
+                               for pid in client_projects}
 
     def has_client(self, name):
         """
@@ -507,14 +708,16 @@ class Toggl(object):
             if client.toggl_name == name:
                 return id_
 
-    def get_all_clients(self):
+    def get_all_clients(self, wid=None):
         """ 
         Return dictionary of where keys are client 
         identifiers and values ClientProjects in Toggl. 
+
+        :param int wid: workspace identifier, defaults to self.wid.
         """
-        r = requests.get(self.CLIENTS, auth=self.auth)
         r_dict = {}
-        for j in r.json():
+        for j in self.iter_json(self.WORKSPACES + '/%s/clients' % (wid or self.wid),
+                                'toggl.clients'):
             try:
                 r_dict[j.get('id')] = ClientProject.from_toggl(j)
             except EntryMismatchException:
@@ -523,19 +726,19 @@ class Toggl(object):
 
     def get_timewax_project_breakdown(self, pid):
         """
-        Get Timewax code and breakdown based on Toggl pid. This searches the self.projects
-        dictionary for the project with given pid and its associated client identifier.
-        It then returns a tuple with the two Timewax codes.
+        Get Timewax code and breakdown based on Toggl pid. This looks up the client
+        identifier for the project with given pid and finds both in the self.clients
+        and self.projects dictionaries. It then returns a tuple with the two Timewax codes.
 
         :param int pid: project identifier
         :return tuple: (client.timewax_code, project.timewax_code)
         """
-        for client_id, projects in self.projects.items():
-            if pid in projects:
-                break
-        else:
+        if pid not in self._project_index:
             raise EntryMismatchException(u'Client not found for project %s' % pid)
 
+        client_id = self._project_index[pid]
+        projects = self.projects.get(client_id, {})
+
         try:
             project_code = self.clients.get(client_id).timewax_code
             breakdown = projects.get(pid).timewax_code
@@ -543,21 +746,22 @@ class Toggl(object):
         except AttributeError:
             raise EntryMismatchException(u'Cannot find Timewax code for project %s' % projects.get(pid))
 
-    def get_all_projects(self):
+    def get_all_projects(self, wid=None):
         """
         Builds dictionary with all ProjectBreakdowns currently available in Toggl. This
         dictionary has client identifiers as keys, and each value is another dictionary
         with project identifier as keys and ProjectBreakdown objects as value.
 
+        :param int wid: workspace identifier, defaults to self.wid.
         :return dict: project dictionary.
         """
-        r = requests.get(self.WORKSPACES + '/%s/projects' % self.wid,
-                         params={'per_page': 1000,
-                                 'active': 'both'},
-                         auth=self.auth)
-        
+        projects = self.iter_json(self.WORKSPACES + '/%s/projects' % (wid or self.wid),
+                                  'toggl.projects',
+                                  params={'per_page': 1000,
+                                          'active': 'both'})
+
         project_dict = {}
-        for p in r.json():
+        for p in projects:
             client_id = p.get('cid')
             project_id = p.get('id')
             try:
@@ -577,43 +781,173 @@ class Toggl(object):
 
         n_days_ago = arrow.now().shift(days=-n_days)
         params = {u'start_date': n_days_ago.isoformat()}
-        logger.info(u'Getting Toggl entries since: %s' % n_days_ago)
+        logger.info(u'Getting Toggl entries since: %s', n_days_ago)
+
+        entries = self.iter_json(self.TIME_ENTRIES, 'toggl.time_entries', params=params)
 
-        r = requests.get(self.TIME_ENTRIES, params=params, auth=self.auth)
-        for entry in r.json():
-            project_id = entry.get('pid')
-            if not project_id:
+        if self.on_demand:
+            entries = self._resolve_as_needed(entries)
+
+        for entry in entries:
+            time_entry = self.entry_from_json(entry)
+            if time_entry is not None:
+                yield time_entry
+
+    def _resolve_as_needed(self, entries, batch_size=ON_DEMAND_BATCH):
+        """
+        Pass on time entries of our workspaces once their projects are known.
+        Entries with unknown projects are held back until batch_size of them are
+        waiting, then their projects are resolved together.
+
+        :param entries: iterable of decoded Toggl time entries.
+        :param int batch_size: entries waiting for their projects, at most.
+        :return: generator of decoded time entries.
+        """
+        waiting = []
+        for entry in entries:
+            pid = entry.get('pid')
+            if not pid or entry.get('wid') not in self.workspaces:
                 continue
 
-            try:
-                project, breakdown = self.get_timewax_project_breakdown(project_id)
-            except EntryMismatchException:
-                logger.info(u'Skipping entry with mismatch, entry start (%s), description: %s' %
-                            (entry.get('start'), entry.get('description')))
+            known = pid in self._project_index or pid in self._unresolvable
+            if known and not waiting:
+                yield entry
                 continue
 
-            yield TimeEntry(description=entry.get('description'),
-                            duration=entry.get('duration'),
-                            guid=entry.get('guid'),
-                            start=entry.get('start'),
-                            stop=entry.get('stop'),
-                            wid=entry.get('wid'),
-                            project=project,
-                            breakdown=breakdown)
+            waiting.append(entry)
+            if len(waiting) >= batch_size:
+                self.resolve_projects({e.get('pid') for e in waiting})
+                for waiting_entry in waiting:
+                    yield waiting_entry
+                waiting = []
+
+        if waiting:
+            self.resolve_projects({e.get('pid') for e in waiting})
+            for waiting_entry in waiting:
+                yield waiting_entry
+
+    def _add_resolved(self, clients, projects):
+        """ Add clients and projects in the form of get_all_clients and get_all_projects. """
+        with self._lock:
+            self.clients.update(clients)
+            for client_id, client_projects in projects.items():
+                self.projects.setdefault(client_id, {}).update(client_projects)
+                for pid in client_projects:
+                    self._project_index[pid] = client_id
+
+    def _get_object(self, url, endpoint):
+        """ Get a single object from Toggl, or None if it does not exist or is not accessible. """
+        r = self.transport.get(url, endpoint, auth=self.auth)
+        if r.status_code != 200:
+            return None
+        try:
+            return r.json().get('data')
+        except ValueError:
+            return None
+
+    def resolve_projects(self, pids):
+        """
+        Get projects, and their clients, that are not known yet. They are read
+        from the catalog mirror if it has them, otherwise each is requested by
+        identifier, concurrently, and stored in the mirror. All are added to
+        self.projects and self.clients. Projects the mirror knows not to be
+        Timewax projects are not requested again.
+
+        :param pids: Toggl project identifiers.
+        """
+        pids = [pid for pid in pids if pid not in self._project_index and pid not in self._unresolvable]
+
+        if pids and self.catalog is not None:
+            clients, projects, unresolvable = self.catalog.find_projects(pids)
+            self._add_resolved(clients, projects)
+            with self._lock:
+                self._unresolvable.update(unresolvable)
+            pids = [pid for pid in pids if pid not in self._project_index and pid not in unresolvable]
+
+        if not pids:
+            return
+
+        logger.info(u'Getting %s Toggl projects and their clients.', len(pids))
+
+        with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as executor:
+            projects = list(executor.map(
+                lambda pid: self._get_object(self.PROJECTS + '/%s' % pid, 'toggl.project'), pids))
+
+            client_ids = {p.get('cid') for p in projects
+                          if p and p.get('cid') and p.get('cid') not in self.clients}
+            clients = list(executor.map(
+                lambda cid: self._get_object(self.CLIENTS + '/%s' % cid, 'toggl.client'), client_ids))
 
-    def add_client(self, name):
+        if self.catalog is not None:
+            for data in clients:
+                if data:
+                    self.catalog.store_client(data)
+            for data in projects:
+                if data:
+                    self.catalog.store_project(data)
+
+        with self._lock:
+            for data in clients:
+                if not data:
+                    continue
+                try:
+                    self.clients[data.get('id')] = ClientProject.from_toggl(data)
+                except EntryMismatchException:
+                    continue
+
+            for pid, data in zip(pids, projects):
+                project = ProjectBreakdown.from_toggl(data) if data else None
+                if project is None or data.get('cid') not in self.clients:
+                    self._unresolvable.add(pid)
+                    continue
+
+                self.projects.setdefault(data.get('cid'), {})[pid] = project
+                self._project_index[pid] = data.get('cid')
+
+    def entry_from_json(self, entry):
+        """
+        Create TimeEntry from a Toggl time entry, with the Timewax codes of its project.
+
+        :param dict entry: time entry response from Toggl API.
+        :return: TimeEntry, or None if the entry is not on a Timewax project in our workspaces.
         """
-        Add client to Toggl.
+        project_id = entry.get('pid')
+        if not project_id or entry.get('wid') not in self.workspaces:
+            return None
+
+        try:
+            project, breakdown = self.get_timewax_project_breakdown(project_id)
+        except EntryMismatchException:
+            logger.debug(u'Skipping entry with mismatch, entry start (%s), description: %s',
+                         entry.get('start'), entry.get('description'),
+                         extra={'category': 'entry mismatch'})
+            return None
+
+        return TimeEntry(description=entry.get('description'),
+                         duration=entry.get('duration'),
+                         guid=entry.get('guid'),
+                         pid=project_id,
+                         start=entry.get('start'),
+                         stop=entry.get('stop'),
+                         wid=entry.get('wid'),
+                         project=project,
+                         breakdown=breakdown)
+
+    def add_client(self, name, wid=None):
+        """
+        Add client to Toggl. Safe to call from multiple threads.
 
         :param str name: name the client will have.
+        :param int wid: workspace identifier, defaults to self.wid.
+        :return int: identifier of the new client, or None if it could not be added.
         """
         package = {
             'client': {
                 'name': name,
-                'wid': self.wid
+                'wid': wid or self.wid
             }
         }
-        r = requests.post(self.CLIENTS, json=package, auth=self.auth)
+        r = self.transport.post(self.CLIENTS, 'toggl.add_client', json=package, auth=self.auth)
         
         try:
             data = r.json().get('data')
@@ -621,34 +955,42 @@ class Toggl(object):
             data = {}
         
         if name in data.get('name', ''):
-            logger.info(u'Added client "%s" successfully.' % name)
-            self.clients.update(
-                {data.get('id'): ClientProject.from_toggl(data)}
-            )
-            self.projects.update(
-                {data.get('id'): {}}
-            )
+            logger.info(u'Added client "%s" successfully.', name, extra={'category': 'added client'})
+            with self._lock:
+                self.clients.update(
+                    {data.get('id'): ClientProject.from_toggl(data)}
+                )
+                self.projects.setdefault(data.get('id'), {})
+            if self.catalog is not None:
+                self.catalog.store_client(data)
+            return data.get('id')
         else:
-            logger.info(u'Could not add client: %s' % r.text)
+            logger.info(u'Could not add client: %s', r.text)
 
     def add_project(self, client_id, project_name):
         """
         Add project to Toggl for a given client based on its identifier.
+        Safe to call from multiple threads.
 
         :param int client_id: Toggl id for client
         :param project_name: name for new project
+        :return int: identifier of the new project, or None if it could not be added.
         """
         
+        # Projects have to be in the same workspace as their client.
+        client = self.clients.get(client_id)
+        wid = getattr(client, 'wid', None) or self.wid
+
         package = {
             "project":
                 {"name": project_name,
-                 "wid": self.wid,
+                 "wid": wid,
                  "is_private": True,
                  "cid": client_id
                  }
             }
 
-        r = requests.post(self.PROJECTS, json=package, auth=self.auth)
+        r = self.transport.post(self.PROJECTS, 'toggl.add_project', json=package, auth=self.auth)
 
         try:
             data = r.json().get('data')
@@ -658,11 +1000,14 @@ class Toggl(object):
         if project_name in data.get('name', ''):
             project_id = data.get('id')
 
-            try:
-                self.projects[client_id].update({project_id: ProjectBreakdown.from_toggl(data)})
-            except KeyError:
-                self.projects[client_id] = {project_id: ProjectBreakdown.from_toggl(data)}
+            with self._lock:
+                self.projects.setdefault(client_id, {}).update(
+                    {project_id: ProjectBreakdown.from_toggl(data)})
+                self._project_index[project_id] = client_id
+            if self.catalog is not None:
+                self.catalog.store_project(data)
 
-            logger.info(u'Added project: %s ' % project_name)
+            logger.info(u'Added project: %s ', project_name, extra={'category': 'added project'})
+            return project_id
         else:
-            logger.info(u'Failed to add project "%s": %s' % project_name, r.text)
+            logger.info(u'Failed to add project "%s": %s', project_name, r.text)
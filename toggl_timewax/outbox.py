@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Write-ahead log of uploads to Timewax, to finish interrupted runs. """
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import arrow
+
+from toggl_timewax.main import TimeEntry, Timewax
+
+logger = logging.getLogger('toggl-timewax')
+
+# Entries are considered uploaded if Timewax has them to within this many seconds.
+TOLERANCE = 60
+
+
+class Outbox(object):
+    """
+    Write-ahead log for uploads to Timewax. Entries are stored as pending before
+    they are sent and marked done once Timewax answered valid. Pending entries
+    left behind by an interrupted run are checked against Timewax for only the
+    dates they cover, and sent again if Timewax does not have them.
+    """
+
+    SCHEMA = u"""
+        CREATE TABLE IF NOT EXISTS outbox (
+            batch TEXT,
+            guid TEXT,
+            date TEXT,
+            expected REAL,
+            entry TEXT,
+            state TEXT,
+            updated REAL,
+            PRIMARY KEY (batch, guid)
+        );
+        CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state);
+    """
+
+    # Seconds entries are kept before they are removed. Pending entries older than
+    # this are given up on; if still within the sync window they are found again by
+    # the normal comparison with Timewax.
+    KEEP = 7 * 24 * 60 * 60
+
+    def __init__(self, path):
+        """
+        :param str path: location of the SQLite database, created if it does not exist.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+            self.connection.execute(u"DELETE FROM outbox WHERE updated < ?",
+                                    (time.time() - self.KEEP,))
+
+    @staticmethod
+    def _serialize(entry):
+        return json.dumps({attribute: getattr(entry, attribute) for attribute in TimeEntry.__slots__})
+
+    @staticmethod
+    def _deserialize(data):
+        return TimeEntry(**json.loads(data))
+
+    def record(self, entries, known=None, supersedes=()):
+        """
+        Durably store entries as pending.
+
+        :param entries: list of TimeEntry objects about to be sent.
+        :param dict known: Timewax entries by GUID at the time of sending, to know
+            the total duration Timewax should have once these entries are added.
+        :param supersedes: identifiers of pending batches whose entries are sent
+            again in this batch. They are no longer pending.
+        :return str: batch identifier.
+        """
+        known = known or {}
+        batch = uuid.uuid4().hex
+        now = time.time()
+
+        rows = []
+        for entry in entries:
+            previous = known.get(entry.guid)
+            expected = entry.duration + (previous.duration if previous is not None else 0)
+            rows.append((batch, entry.guid, entry.date, expected, self._serialize(entry), now))
+
+        with self._lock, self.connection:
+            self.connection.executemany(
+                u"INSERT OR REPLACE INTO outbox (batch, guid, date, expected, entry, state, updated) "
+                u"VALUES (?, ?, ?, ?, ?, 'pending', ?)", rows)
+            self.connection.executemany(
+                u"UPDATE outbox SET state = 'superseded', updated = ? WHERE batch = ? AND state = 'pending'",
+                [(now, old_batch) for old_batch in supersedes])
+        return batch
+
+    def mark_done(self, batch):
+        """ Mark all entries of a batch as uploaded. """
+        with self._lock, self.connection:
+            self.connection.execute(
+                u"UPDATE outbox SET state = 'done', updated = ? WHERE batch = ?", (time.time(), batch))
+
+    def pending(self):
+        """
+        :return list: (batch, guid, date, expected, TimeEntry) tuples not known to be uploaded.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                u"SELECT batch, guid, date, expected, entry FROM outbox "
+                u"WHERE state = 'pending' ORDER BY date").fetchall()
+        return [(batch, guid, date, expected, self._deserialize(entry))
+                for batch, guid, date, expected, entry in rows]
+
+    def send(self, timewax, entries, known=None, supersedes=()):
+        """
+        Record entries, send them to Timewax and mark them done if Timewax accepted them.
+        Can be used in place of Timewax.add_entries.
+
+        :param timewax: Timewax object.
+        :param entries: list of TimeEntry objects.
+        :param dict known: Timewax entries by GUID, see record().
+        :param supersedes: pending batch identifiers, see record().
+        :return bool: whether Timewax accepted the entries.
+        """
+        batch = self.record(entries, known, supersedes)
+        if timewax.add_entries(entries):
+            self.mark_done(batch)
+            return True
+        return False
+
+    def resume(self, timewax):
+        """
+        Finish uploads of earlier runs that were interrupted. Timewax is asked for
+        entries on the dates of pending entries only; what it already has is marked
+        done, and only what is missing is sent again.
+
+        :param timewax: Timewax object.
+        :return int: number of entries sent again.
+        """
+        pending = self.pending()
+        if not pending:
+            return 0
+
+        logger.info(u'Found %s pending uploads from an earlier run. Checking Timewax.', len(pending))
+
+        # One day margin on both sides, as Toggl and Timewax may disagree on time zones.
+        dates = [arrow.get(date, Timewax.DATE_FORMAT) for _, _, date, _, _ in pending]
+        present = timewax.get_entries(min(dates).shift(days=-1).format(Timewax.DATE_FORMAT),
+                                      max(dates).shift(days=1).format(Timewax.DATE_FORMAT))
+
+        # The same GUID can be pending more than once, e.g. an entry and a later
+        # compensation for it. Expected durations are totals, so the largest one counts.
+        latest = {}
+        for batch, guid, date, expected, entry in pending:
+            if guid not in latest or expected > latest[guid][0]:
+                latest[guid] = (expected, entry)
+
+        to_send = []
+        for guid, (expected, entry) in latest.items():
+            uploaded = present[guid].duration if guid in present else 0
+            if uploaded < expected - TOLERANCE:
+                entry.duration = expected - uploaded
+                to_send.append(entry)
+
+        batches = {batch for batch, _, _, _, _ in pending}
+
+        if to_send:
+            # The new batch replaces the old ones, also if Timewax rejects it, so
+            # that a rejected batch does not pile up another pending copy every run.
+            logger.info(u'Sending %s entries that did not reach Timewax.', len(to_send))
+            if not self.send(timewax, to_send, known=present, supersedes=batches):
+                return 0
+            return len(to_send)
+
+        # Timewax has everything.
+        for batch in batches:
+            self.mark_done(batch)
+        return 0
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Background uploading of time entries to Timewax in batches. """
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+import threading
+
+# Python 2/3 compatibility
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger('toggl-timewax')
+
+_STOP = object()
+
+
+class UploadPipeline(object):
+    """
+    Bounded queue with a background worker that sends batches of time entries
+    while new entries are still being produced. put() blocks when the queue is
+    full, so a fast producer cannot run ahead of the uploads. Use as a context
+    manager to have all queued entries sent when the block is left.
+    """
+
+    def __init__(self, send, batch_size=50, max_queue=500, flush_interval=2.0):
+        """
+        :param send: callable taking a list of TimeEntry objects, returns True on success.
+        :param int batch_size: maximum number of entries per send call.
+        :param int max_queue: number of queued entries before put() blocks.
+        :param float flush_interval: seconds to wait for a full batch before sending what is there.
+        """
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self.sent = 0
+        self.batches = 0
+        self.failed = []
+
+        self._thread = threading.Thread(target=self._run, name='timewax-upload')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, entry):
+        """ Queue an entry for upload, blocking while the queue is full. """
+        self.queue.put(entry)
+
+    def close(self):
+        """
+        Send everything still queued and wait for the worker to finish.
+
+        :return int: number of entries that could not be sent.
+        """
+        self.queue.put(_STOP)
+        self._thread.join()
+        return len(self.failed)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _flush(self, batch):
+        try:
+            success = self.send(batch)
+        except Exception as e:
+            logger.error(u'Error while sending %s entries: %s', len(batch), e)
+            success = False
+
+        self.batches += 1
+        if success:
+            self.sent += len(batch)
+        else:
+            self.failed.extend(batch)
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval if batch else None)
+            except queue.Empty:
+                self._flush(batch)
+                batch = []
+                continue
+
+            if item is _STOP:
+                break
+
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+
+        if batch:
+            self._flush(batch)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Concurrent creation of missing Toggl clients and projects. """
+
+from __future__ import absolute_import, division, print_function
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from toggl_timewax.concurrency import DEFAULT_WORKERS, RateLimiter
+from toggl_timewax.transport import LimitExceeded
+
+logger = logging.getLogger('toggl-timewax')
+
+
+class CreationPlanner(object):
+    """
+    Collects the clients and projects missing in Toggl and creates them
+    in dependency order: first all clients concurrently, then all projects
+    concurrently. Requests to Toggl are spaced out by a RateLimiter.
+    """
+
+    def __init__(self, toggl, max_workers=DEFAULT_WORKERS, calls_per_second=4):
+        self.toggl = toggl
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(calls_per_second)
+
+        # client toggl_name -> list of project toggl_names, in discovery order.
+        self.planned = OrderedDict()
+        self.failures = []
+        # (kind, name) tuples that were not attempted because the deadline
+        # passed or the request budget ran out, and the error that said so.
+        self.cancelled = []
+        self.limit_error = None
+
+    def add(self, client_project, project_breakdown):
+        """
+        Plan creation of a project for a client. The client is created
+        too if it does not exist in Toggl yet.
+
+        :param client_project: ClientProject object.
+        :param project_breakdown: ProjectBreakdown object.
+        """
+        projects = self.planned.setdefault(client_project.toggl_name, [])
+        if project_breakdown.toggl_name not in projects:
+            projects.append(project_breakdown.toggl_name)
+
+    @property
+    def missing_clients(self):
+        return [name for name in self.planned if not self.toggl.has_client(name)]
+
+    def __len__(self):
+        return sum(len(projects) for projects in self.planned.values())
+
+    def _add_client(self, name):
+        with self.rate_limiter:
+            return self.toggl.add_client(name)
+
+    def _add_project(self, client_id, name):
+        with self.rate_limiter:
+            return self.toggl.add_project(client_id, name)
+
+    def execute(self):
+        """
+        Create all planned clients and projects.
+
+        :return list: (kind, name) tuples for everything that failed.
+        """
+        if not self.planned:
+            return self.failures
+
+        logger.info(u'Creating %s clients and %s projects in Toggl.',
+                    len(self.missing_clients), len(self))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(name, executor.submit(self._add_client, name))
+                       for name in self.missing_clients]
+            self._collect('client', futures)
+
+            futures = []
+            for client_name, project_names in self.planned.items():
+                client_id = self.toggl.get_client_id(client_name)
+                if client_id is None:
+                    self.failures.extend(('project', n) for n in project_names)
+                    continue
+
+                for project_name in project_names:
+                    futures.append(
+                        (project_name, executor.submit(self._add_project, client_id, project_name)))
+
+            self._collect('project', futures)
+
+        return self.failures
+
+    def _collect(self, kind, futures):
+        """ Wait for futures and record the ones that did not create anything. """
+        for name, future in futures:
+            error = future.exception()
+            if isinstance(error, LimitExceeded):
+                self.cancelled.append((kind, name))
+                self.limit_error = self.limit_error or error
+            elif error is not None:
+                logger.error(u'Error while creating %s "%s": %s', kind, name, error)
+                self.failures.append((kind, name))
+            elif future.result() is None:
+                self.failures.append((kind, name))
+
+    def report(self):
+        """
+        Log a summary of what was created and what failed.
+        """
+        n_failed_projects = len([f for f in self.failures + self.cancelled if f[0] == 'project'])
+        logger.info(u'Created %s of %s planned projects.',
+                    len(self) - n_failed_projects, len(self))
+
+        if self.cancelled:
+            logger.error(u'%s Cancelled creating %s clients and projects.',
+                         self.limit_error, len(self.cancelled))
+
+        for kind, name in self.failures:
+            logger.error(u'Failed to create %s: %s', kind, name)
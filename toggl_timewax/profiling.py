@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Profiling of CLI commands. """
+
+from __future__ import absolute_import, division, print_function
+
+from collections import Counter
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Python 2/3 compatibility
+try:
+    process_time = time.process_time
+except AttributeError:
+    process_time = time.clock
+
+PROFILERS = ('cprofile', 'sampling')
+
+# Module whose parsing and formatting time is reported separately.
+MAIN_MODULE = os.path.join('toggl_timewax', 'main.py')
+
+# Functions that threads wait in without using CPU, by file and name. Only used
+# where per thread CPU clocks are not available.
+WAITING = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('_base.py', 'result'),
+    ('_base.py', 'wait'),
+    ('thread.py', '_worker'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'readinto'),
+    ('ssl.py', 'read'),
+    ('ssl.py', 'recv_into'),
+}
+
+
+def thread_cpu_time(thread_id):
+    """ CPU time used by a thread in seconds, or None where this is not available. """
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+class SamplingProfiler(object):
+    """
+    Samples the stacks of all threads at a fixed interval. Unlike cProfile this
+    also sees the worker threads that talk to Toggl and Timewax, at the cost of
+    precision. Samples are weighted by the CPU time the thread used since its
+    previous sample, so threads waiting on locks, queues or the network do not
+    count. Where per thread CPU clocks are not available, threads that wait in
+    one of the WAITING functions are skipped instead.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        # Seconds of CPU time per function, own and including the functions it calls.
+        self.own = Counter()
+        self.cumulative = Counter()
+        self.total = 0.0
+        self.samples = 0
+        self._cpu = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler')
+        self._thread.daemon = True
+
+    def _weight(self, thread_id, frame):
+        """ CPU seconds to attribute to the stack of a thread, 0 if it is waiting. """
+        cpu = thread_cpu_time(thread_id)
+        if cpu is None:
+            code = frame.f_code
+            return 0 if (os.path.basename(code.co_filename), code.co_name) in WAITING else self.interval
+
+        previous = self._cpu.get(thread_id)
+        self._cpu[thread_id] = cpu
+        return cpu - previous if previous is not None else 0
+
+    def _run(self):
+        own_id = threading.current_thread().ident
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                weight = self._weight(thread_id, frame)
+                if weight <= 0:
+                    continue
+
+                self.samples += 1
+                self.total += weight
+                code = frame.f_code
+                self.own[(code.co_filename, code.co_firstlineno, code.co_name)] += weight
+
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if key not in seen:
+                        self.cumulative[key] += weight
+                        seen.add(key)
+                    frame = frame.f_back
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(u'# CPU seconds sampled every %ss: own cumulative function\n' % self.interval)
+            for key, seconds in self.cumulative.most_common():
+                f.write(u'%.4f %.4f %s:%d(%s)\n' % ((self.own[key], seconds) + key))
+
+
+class CommandProfiler(object):
+    """
+    Profiles a CLI command and writes the profile to a file, plus a short summary
+    that separates waiting on the network from CPU time.
+    """
+
+    def __init__(self, path, profiler='sampling', top=15):
+        """
+        :param str path: file to write the profile to (pstats format for cprofile).
+        :param str profiler: 'sampling' (all threads) or 'cprofile' (main thread only, exact).
+            Logging in and loading the catalog happen in worker threads, which
+            only the sampling profiler sees.
+        :param int top: number of functions in the summary.
+        """
+        if profiler not in PROFILERS:
+            raise ValueError(u'Profiler has to be one of: %s' % u', '.join(PROFILERS))
+        self.path = path
+        self.kind = profiler
+        self.top = top
+        self.profiler = cProfile.Profile() if profiler == 'cprofile' else SamplingProfiler()
+
+    def start(self):
+        self._wall = time.time()
+        self._cpu = process_time()
+        self.profiler.enable()
+
+    def stop(self, transport=None):
+        """
+        Stop profiling, write the profile and return a summary.
+
+        :param transport: Transport used by the command, for time spent on requests.
+        :return str: summary text.
+        """
+        self.profiler.disable()
+        wall = time.time() - self._wall
+        cpu = process_time() - self._cpu
+
+        self.profiler.dump_stats(self.path)
+
+        lines = [u'Profile written to: %s' % self.path,
+                 u'Wall time:          %8.3f s' % wall,
+                 u'CPU time:           %8.3f s' % cpu]
+
+        if transport is not None:
+            lines.append(u'Network wait:       %8.3f s in %s requests (summed over threads)' %
+                         (transport.network_time, transport.request_count))
+
+        if self.kind == 'cprofile':
+            lines.extend(self._cprofile_summary())
+        else:
+            lines.extend(self._sampling_summary())
+
+        summary = u'\n'.join(lines)
+        with io.open(self.path + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary + u'\n')
+        return summary
+
+    def _cprofile_summary(self):
+        stats = pstats.Stats(self.profiler)
+
+        # Cumulative time of main.py functions called from outside main.py, so
+        # the arrow and ElementTree calls made for parsing and formatting count.
+        main_time = 0.0
+        for (filename, _, _), (_, _, _, _, callers) in stats.stats.items():
+            if filename.endswith(MAIN_MODULE):
+                main_time += sum(edge[3] for caller, edge in callers.items()
+                                 if not caller[0].endswith(MAIN_MODULE))
+
+        lines = [u'Time in main.py:    %8.3f s cumulative (wall clock, main thread only, '
+                 u'includes its requests)' % main_time,
+                 u'Top functions by own time:']
+
+        hot = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top]
+        for (filename, line, name), (_, calls, own, cumulative, _) in hot:
+            lines.append(u'  %8.3f s own %8.3f s cumulative %8d calls  %s:%d(%s)' %
+                         (own, cumulative, calls, os.path.basename(filename), line, name))
+        return lines
+
+    def _sampling_summary(self):
+        profiler = self.profiler
+        total = profiler.total or 1
+        # Any stack through main.py, which includes its arrow and ElementTree calls.
+        main_time = sum(seconds for (filename, _, _), seconds in profiler.cumulative.items()
+                        if filename.endswith(MAIN_MODULE))
+
+        lines = [u'CPU in main.py:     %8.3f s, %.1f %% of %.3f s sampled CPU (all threads)' %
+                 (main_time, 100.0 * main_time / total, profiler.total),
+                 u'Top functions by own CPU:']
+
+        for (filename, line, name), seconds in profiler.own.most_common(self.top):
+            lines.append(u'  %6.1f %%  %s:%d(%s)' %
+                         (100.0 * seconds / total, os.path.basename(filename), line, name))
+        return lines
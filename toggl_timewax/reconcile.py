@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Comparison of Toggl and Timewax time entries. """
+
+from __future__ import absolute_import, division, print_function
+
+from toggl_timewax.main import TimeEntry
+
+# Entries in Toggl and Timewax are considered equal if they differ less than this (seconds).
+DEFAULT_THRESHOLD = 60
+
+
+class DiffPlan(object):
+    """
+    Outcome of comparing Toggl entries against Timewax entries.
+
+    new:       Toggl entries with a GUID unknown to Timewax.
+    grown:     (toggl, timewax) pairs where the Toggl entry is longer.
+    shrunk:    (toggl, timewax) pairs where the Toggl entry is shorter.
+    unchanged: (toggl, timewax) pairs within the threshold of each other.
+    orphaned:  Timewax entries with a GUID not seen in Toggl.
+    running:   Toggl entries without a stop date, these cannot be sent yet.
+    """
+
+    __slots__ = ('new', 'grown', 'shrunk', 'unchanged', 'orphaned', 'running')
+
+    def __init__(self):
+        self.new = []
+        self.grown = []
+        self.shrunk = []
+        self.unchanged = []
+        self.orphaned = []
+        self.running = []
+
+    def counts(self):
+        """ Number of entries per category. """
+        return {name: len(getattr(self, name)) for name in self.__slots__}
+
+    def entries_to_upload(self):
+        """
+        TimeEntry objects that bring Timewax up to date with Toggl. For entries
+        that have grown an additional entry is made to compensate for the difference.
+
+        :return list: TimeEntry objects.
+        """
+        entries = list(self.new)
+        for toggl_entry, timewax_entry in self.grown:
+            entries.append(compensation_entry(toggl_entry, timewax_entry))
+        return entries
+
+    def __repr__(self):
+        return u'DiffPlan(%s)' % u', '.join(
+            u'%s=%s' % (name, len(getattr(self, name))) for name in self.__slots__)
+
+
+def compensation_entry(toggl_entry, timewax_entry):
+    """
+    Copy of toggl_entry with only the duration Timewax does not know about yet.
+
+    :param toggl_entry: TimeEntry from Toggl.
+    :param timewax_entry: TimeEntry from Timewax with the same GUID.
+    :return: TimeEntry
+    """
+    entry = TimeEntry(guid=toggl_entry.guid)
+    for attribute in TimeEntry.__slots__:
+        setattr(entry, attribute, getattr(toggl_entry, attribute))
+    entry.duration = toggl_entry.duration - timewax_entry.duration
+    return entry
+
+
+class Reconciler(object):
+    """
+    Classifies a stream of Toggl entries against Timewax entries keyed by GUID,
+    one entry at a time. Call finish() once the stream is exhausted to find the
+    orphaned Timewax entries.
+    """
+
+    def __init__(self, timewax_entries, threshold=DEFAULT_THRESHOLD):
+        """
+        :param dict timewax_entries: GUID keys and TimeEntry values, as returned
+            by Timewax.get_recent_entries.
+        :param threshold: seconds of difference that are tolerated.
+        """
+        self.timewax_entries = timewax_entries
+        self.threshold = threshold
+        self.plan = DiffPlan()
+        self._seen = set()
+
+    def feed(self, toggl_entry):
+        """
+        Classify a single Toggl entry and add it to the plan.
+
+        :param toggl_entry: TimeEntry from Toggl.
+        :return str: name of the category the entry was put in.
+        """
+        plan = self.plan
+
+        if not toggl_entry.stop:
+            plan.running.append(toggl_entry)
+            return 'running'
+
+        guid = toggl_entry.guid
+        timewax_entry = self.timewax_entries.get(guid)
+
+        if timewax_entry is None:
+            plan.new.append(toggl_entry)
+            return 'new'
+
+        self._seen.add(guid)
+        difference = toggl_entry.duration - timewax_entry.duration
+
+        if difference > self.threshold:
+            plan.grown.append((toggl_entry, timewax_entry))
+            return 'grown'
+        elif difference < -self.threshold:
+            plan.shrunk.append((toggl_entry, timewax_entry))
+            return 'shrunk'
+        else:
+            plan.unchanged.append((toggl_entry, timewax_entry))
+            return 'unchanged'
+
+    def iter_uploads(self, toggl_entries):
+        """
+        Classify a stream of Toggl entries and yield the entries that have to be
+        sent to Timewax as soon as they are known.
+
+        :param toggl_entries: iterable of TimeEntry objects from Toggl.
+        :return: generator of TimeEntry objects.
+        """
+        for toggl_entry in toggl_entries:
+            category = self.feed(toggl_entry)
+            if category == 'new':
+                yield toggl_entry
+            elif category == 'grown':
+                yield compensation_entry(*self.plan.grown[-1])
+
+    def finish(self):
+        """
+        Complete the plan with Timewax entries that were not seen in Toggl.
+
+        :return: DiffPlan
+        """
+        seen = self._seen
+        self.plan.orphaned = [entry for guid, entry in self.timewax_entries.items()
+                              if guid not in seen]
+        return self.plan
+
+
+def reconcile(toggl_entries, timewax_entries, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare Toggl entries with Timewax entries in a single pass.
+
+    :param toggl_entries: iterable of TimeEntry objects from Toggl.
+    :param dict timewax_entries: GUID keys and TimeEntry values from Timewax.
+    :param threshold: seconds of difference that are tolerated.
+    :return: DiffPlan
+    """
+    reconciler = Reconciler(timewax_entries, threshold)
+    feed = reconciler.feed
+    for toggl_entry in toggl_entries:
+        feed(toggl_entry)
+    return reconciler.finish()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Hours per project, breakdown and period for Toggl and Timewax. """
+
+from __future__ import absolute_import, division, print_function
+
+from array import array
+import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TOGGL = 0
+TIMEWAX = 1
+
+PERIODS = ('day', 'week')
+
+# Breakdown that Timewax hours without a GUID, which were not sent from Toggl, are reported under.
+UNTRACKED = u'untracked'
+
+
+class HoursReport(object):
+    """
+    Hours per Timewax project, breakdown and day or week, for both Toggl and
+    Timewax. Entries are stored column wise: an integer code per group and the
+    duration in seconds, so the totals are a single weighted count over all entries.
+    """
+
+    def __init__(self, period='day', since=None, until=None):
+        """
+        :param str period: 'day' or 'week'.
+        :param str since: first day (YYYY-MM-DD) to report, entries before it are left out.
+        :param str until: last day (YYYY-MM-DD) to report, entries after it are left out.
+        """
+        if period not in PERIODS:
+            raise ValueError(u'Period has to be one of: %s' % u', '.join(PERIODS))
+
+        self.period = period
+        self.since = since
+        self.until = until
+        self.groups = {}
+        self.group_keys = []
+
+        # One value per entry in each column.
+        self.codes = array('l')
+        self.seconds = array('d')
+
+        self._periods = {}
+
+    def _period_of(self, start):
+        """ Period label for an ISO formatted start, computed once per distinct day. """
+        day = start[:10]
+        label = self._periods.get(day)
+        if label is None:
+            if self.period == 'week':
+                year, week, _ = datetime.date(int(day[:4]), int(day[5:7]), int(day[8:10])).isocalendar()
+                label = u'%04d-W%02d' % (year, week)
+            else:
+                label = day
+            self._periods[day] = label
+        return label
+
+    def add_entries(self, entries, source):
+        """
+        Add time entries of one source to the report. Entries without a
+        start or a positive duration (e.g. running timers), and entries outside
+        since and until, are left out. Entries without a GUID are reported
+        under the UNTRACKED breakdown.
+
+        :param entries: iterable of TimeEntry objects.
+        :param int source: TOGGL or TIMEWAX.
+        """
+        groups = self.groups
+        group_keys = self.group_keys
+        codes = self.codes
+        seconds = self.seconds
+        period_of = self._period_of
+        since = self.since
+        until = self.until
+
+        for entry in entries:
+            if not entry.start or not entry.duration or entry.duration < 0:
+                continue
+
+            # ISO dates compare as text.
+            day = entry.start[:10]
+            if (since and day < since) or (until and day > until):
+                continue
+
+            breakdown = entry.breakdown if entry.guid else UNTRACKED
+            key = (entry.project, breakdown, period_of(entry.start))
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = len(group_keys)
+                group_keys.append(key)
+
+            # Toggl and Timewax totals of a group are stored next to each other.
+            codes.append(2 * group + source)
+            seconds.append(entry.duration)
+
+    def totals(self):
+        """
+        :return list: seconds per group and source, index 2 * group + source.
+        """
+        size = 2 * len(self.group_keys)
+
+        if numpy is not None:
+            return numpy.bincount(numpy.frombuffer(self.codes, dtype=self.codes.typecode),
+                                  weights=numpy.frombuffer(self.seconds, dtype='d'),
+                                  minlength=size).tolist()
+
+        totals = [0.0] * size
+        for code, duration in zip(self.codes, self.seconds):
+            totals[code] += duration
+        return totals
+
+    def rows(self, discrepancies_only=False):
+        """
+        Sorted report rows.
+
+        :param bool discrepancies_only: only rows where Toggl and Timewax differ by a minute or more.
+        :return list: (project, breakdown, period, toggl_hours, timewax_hours) tuples.
+        """
+        totals = self.totals()
+        rows = []
+        for group, (project, breakdown, period) in enumerate(self.group_keys):
+            toggl_seconds = totals[2 * group + TOGGL]
+            timewax_seconds = totals[2 * group + TIMEWAX]
+
+            if discrepancies_only and abs(toggl_seconds - timewax_seconds) < 60:
+                continue
+
+            rows.append((project or u'', breakdown or u'', period,
+                         toggl_seconds / 3600, timewax_seconds / 3600))
+
+        rows.sort()
+        return rows
+
+    def format(self, discrepancies_only=False):
+        """
+        :param bool discrepancies_only: only rows where Toggl and Timewax differ.
+        :return str: the report as a text table.
+        """
+        lines = [u'%-12s %-12s %-10s %8s %8s %8s' %
+                 (u'project', u'breakdown', self.period, u'toggl', u'timewax', u'diff')]
+        for project, breakdown, period, toggl_hours, timewax_hours in self.rows(discrepancies_only):
+            lines.append(u'%-12s %-12s %-10s %8.2f %8.2f %8.2f' %
+                         (project, breakdown, period, toggl_hours, timewax_hours,
+                          toggl_hours - timewax_hours))
+        return u'\n'.join(lines)
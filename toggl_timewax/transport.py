@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" HTTP layer with timeouts, a deadline and request budgets. """
+
+from __future__ import absolute_import, division, print_function
+
+from collections import Counter
+import functools
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from toggl_timewax.concurrency import DEFAULT_WORKERS
+
+
+class LimitExceeded(Exception):
+    """
+    Base for the limits a command can be given: a deadline and request budgets.
+    """
+    pass
+
+
+class DeadlineExceeded(LimitExceeded):
+    """
+    This will be raised when the time budget for a command has run out.
+    """
+    pass
+
+
+class BudgetExceeded(LimitExceeded):
+    """
+    This will be raised when a command would make more requests than allowed.
+    """
+    pass
+
+
+class Deadline(object):
+    """
+    Point in time after which no new requests should be made.
+    Without seconds there is no deadline.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.expires = time.time() + seconds if seconds else None
+
+    def remaining(self):
+        """ Seconds left, or None if there is no deadline. """
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return self.expires is not None and time.time() >= self.expires
+
+    def check(self):
+        """ Raise DeadlineExceeded if the deadline has passed. """
+        if self.expired():
+            raise DeadlineExceeded(u'Deadline of %s seconds exceeded.' % self.seconds)
+
+
+class RequestBudget(object):
+    """
+    Maximum number of requests, in total and per endpoint. Without
+    limits any number of requests is allowed.
+    """
+
+    def __init__(self, max_requests=None, per_endpoint=None):
+        """
+        :param int max_requests: requests allowed in total.
+        :param dict per_endpoint: endpoint names as keys and requests allowed as values.
+        """
+        self.max_requests = max_requests
+        self.per_endpoint = dict(per_endpoint or {})
+        self.exceeded = None
+
+    def spend(self, total, endpoint, endpoint_count):
+        """
+        Raise BudgetExceeded if one more request would exceed a limit.
+
+        :param int total: requests made so far.
+        :param str endpoint: endpoint of the next request.
+        :param int endpoint_count: requests made so far to this endpoint.
+        """
+        limit = self.per_endpoint.get(endpoint)
+        if limit is not None and endpoint_count >= limit:
+            self.exceeded = u'Budget of %s requests to %s exceeded.' % (limit, endpoint)
+        elif self.max_requests is not None and total >= self.max_requests:
+            self.exceeded = u'Budget of %s requests exceeded.' % self.max_requests
+        else:
+            return
+        raise BudgetExceeded(self.exceeded)
+
+    def check(self):
+        """ Raise BudgetExceeded if a request was refused earlier. """
+        if self.exceeded:
+            raise BudgetExceeded(self.exceeded)
+
+
+class TimedBody(object):
+    """
+    Body of a streamed response. Time spent reading it counts as network time
+    of the transport, so downloading is not mistaken for decoding.
+    """
+
+    def __init__(self, raw, transport):
+        self._raw = raw
+        self._transport = transport
+
+    def read(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return self._raw.read(*args, **kwargs)
+        finally:
+            self._transport.add_network_time(time.time() - start)
+
+    def stream(self, chunk_size=2 ** 16, decode_content=None):
+        # requests only streams from bodies that have stream(), as this wrapper does.
+        if hasattr(self._raw, 'stream'):
+            chunks = self._raw.stream(chunk_size, decode_content=decode_content)
+        else:
+            chunks = iter(functools.partial(self._raw.read, chunk_size), b'')
+        while True:
+            start = time.time()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self._transport.add_network_time(time.time() - start)
+            yield chunk
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        # E.g. decode_content, which is read by the underlying body.
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+
+class Transport(object):
+    """
+    HTTP layer shared by Timewax and Toggl. Every request gets a connect and read
+    timeout for its endpoint, capped by what is left of the deadline. Requests are
+    counted per command and endpoint, and refused once they exceed the budget.
+    """
+
+    # (connect, read) timeouts in seconds.
+    DEFAULT_TIMEOUT = (5, 30)
+
+    def __init__(self, timeouts=None, deadline=None, pool_size=2 * DEFAULT_WORKERS, budget=None):
+        """
+        :param dict timeouts: endpoint names as keys and (connect, read) tuples as values.
+            The 'default' key applies to endpoints that are not listed.
+        :param deadline: Deadline object for all requests made through this transport.
+        :param int pool_size: number of connections kept open per host.
+        :param budget: RequestBudget object for all requests made through this transport.
+        """
+        self.timeouts = dict(timeouts or {})
+        self.deadline = deadline or Deadline()
+        self.budget = budget or RequestBudget()
+
+        # Seconds spent waiting for responses, summed over all threads.
+        self.network_time = 0.0
+        self.request_count = 0
+        # Name of the command requests are counted for.
+        self.command = None
+        self.endpoint_counts = Counter()
+        # (command, endpoint) tuples as keys.
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def timeout_for(self, endpoint):
+        """
+        :param str endpoint: endpoint name, e.g. 'timewax.entries_list'.
+        :return tuple: (connect, read) timeout in seconds.
+        """
+        connect, read = self.timeouts.get(endpoint) or self.timeouts.get('default') or self.DEFAULT_TIMEOUT
+
+        remaining = self.deadline.remaining()
+        if remaining is not None:
+            # The deadline can pass after it was checked; requests does not accept a zero timeout.
+            if remaining <= 0:
+                raise DeadlineExceeded(u'Deadline of %s seconds exceeded.' % self.deadline.seconds)
+            connect, read = min(connect, remaining), min(read, remaining)
+        return connect, read
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        """
+        Make a request with the timeouts for endpoint.
+
+        :param str method: HTTP method.
+        :param str url: url to request.
+        :param str endpoint: name used to look up timeouts.
+        :return: requests.Response
+        """
+        self.deadline.check()
+        with self._lock:
+            self.budget.spend(self.request_count, endpoint, self.endpoint_counts[endpoint])
+            self.request_count += 1
+            self.endpoint_counts[endpoint] += 1
+            self.counts[(self.command, endpoint)] += 1
+
+        kwargs.setdefault('timeout', self.timeout_for(endpoint))
+
+        start = time.time()
+        try:
+            response = self.session.request(method, url, **kwargs)
+            if kwargs.get('stream'):
+                response.raw = TimedBody(response.raw, self)
+            return response
+        except requests.Timeout:
+            if self.deadline.expired():
+                raise DeadlineExceeded(u'Deadline of %s seconds exceeded during request to %s.' %
+                                       (self.deadline.seconds, endpoint or url))
+            raise
+        finally:
+            # For streamed responses this covers waiting for the headers, reading
+            # the body is added by TimedBody.
+            self.add_network_time(time.time() - start)
+
+    def add_network_time(self, seconds):
+        with self._lock:
+            self.network_time += seconds
+
+    def check(self):
+        """ Raise if the deadline passed or a request was refused for the budget. """
+        self.deadline.check()
+        self.budget.check()
+
+    def report(self):
+        """
+        :return list: lines with the number of requests in total and per command and endpoint.
+        """
+        lines = [u'Requests: %s' % self.request_count]
+        for (command, endpoint), count in sorted(self.counts.items(),
+                                                   key=lambda item: (item[0][0] or u'', item[0][1] or u'')):
+            lines.append(u'  %6s %s %s' % (count, command or u'-', endpoint or u'-'))
+        return lines
+
+    def get(self, url, endpoint=None, **kwargs):
+        return self.request('GET', url, endpoint, **kwargs)
+
+    def post(self, url, endpoint=None, **kwargs):
+        return self.request('POST', url, endpoint, **kwargs)